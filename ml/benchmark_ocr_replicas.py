@@ -0,0 +1,116 @@
+"""
+Throughput sweep of OCR replica pool configurations.
+
+Starts a ReplicaPool for every combination of replica count and threads
+per replica, runs the sample images through it and reports images per
+second, per-image latency, start-up time and the memory of the replicas
+(proportional set size, which counts shared weight pages once), then
+names the configuration with the highest throughput. Combinations needing
+more cores than the machine has are skipped unless --oversubscribe is set.
+
+Usage:
+    python benchmark_ocr_replicas.py samples/ [--replicas 1 2 4] [--threads 1 2 4]
+    python benchmark_ocr_replicas.py samples/ --rounds 5 --output sweep.json
+"""
+import argparse
+import json
+import sys
+import time
+
+from ocr_batch import list_images
+from ocr_workers import SHARE_WEIGHTS, ReplicaPool, available_cores
+
+
+def proportional_set_size(pid):
+    """PSS of a process in bytes, or None where /proc does not report it."""
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                if line.startswith('Pss:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def run_configuration(paths, replicas, threads, rounds, share_weights):
+    with ReplicaPool(replicas, threads, share_weights) as pool:
+        # One untimed pass, so every replica has seen some traffic
+        pool.map(paths[:replicas])
+
+        latencies = []
+        futures = []
+        started = time.perf_counter()
+        for _ in range(rounds):
+            for path in paths:
+                submitted_at = time.perf_counter()
+                future = pool.submit(path)
+                future.add_done_callback(
+                    lambda _, at=submitted_at: latencies.append(time.perf_counter() - at))
+                futures.append(future)
+        errors = sum('error' in future.result() for future in futures)
+        elapsed = time.perf_counter() - started
+
+        memory = [proportional_set_size(stats['pid']) for stats in pool.stats()]
+        start_seconds = pool.start_seconds
+
+    latencies.sort()
+    images = len(futures)
+    return {
+        'replicas': replicas,
+        'threads': threads,
+        'imagesPerSecond': round(images / elapsed, 2),
+        'p50Ms': round(latencies[len(latencies) // 2] * 1000, 1),
+        'p99Ms': round(latencies[min(len(latencies) - 1, int(0.99 * len(latencies)))] * 1000, 1),
+        'startMs': round(start_seconds * 1000, 1),
+        'memoryMb': round(sum(memory) / 2 ** 20, 1) if None not in memory else None,
+        'errors': errors
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('source', help='Directory of sample images or manifest file')
+    parser.add_argument('--replicas', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--rounds', type=int, default=3, help='Passes over the sample images')
+    parser.add_argument('--share-weights', choices=('fork', 'none'), default=SHARE_WEIGHTS)
+    parser.add_argument('--oversubscribe', action='store_true',
+                        help='Also run combinations needing more cores than available')
+    parser.add_argument('--output', help='Write the results as JSON to this file')
+    args = parser.parse_args()
+
+    paths = list_images(args.source)
+    if not paths:
+        print("No sample images found.")
+        return 1
+    cores = len(available_cores())
+
+    results = []
+    print(f"{len(paths)} images x {args.rounds} rounds on {cores} cores")
+    print(f"{'replicas':>8} {'threads':>7} {'img/s':>7} {'p50 ms':>8} {'p99 ms':>8} {'start ms':>9} {'PSS MB':>8}")
+    for replicas in args.replicas:
+        for threads in args.threads:
+            if replicas * threads > cores and not args.oversubscribe:
+                continue
+            row = run_configuration(paths, replicas, threads, args.rounds, args.share_weights)
+            results.append(row)
+            memory = f"{row['memoryMb']:8.1f}" if row['memoryMb'] is not None else f"{'-':>8}"
+            print(f"{replicas:8d} {threads:7d} {row['imagesPerSecond']:7.2f} {row['p50Ms']:8.1f} "
+                  f"{row['p99Ms']:8.1f} {row['startMs']:9.0f} {memory}", flush=True)
+
+    if not results:
+        print("No configuration fits the available cores; pass --oversubscribe to run them anyway.")
+        return 1
+    best = max(results, key=lambda row: row['imagesPerSecond'])
+    print(f"Best throughput: OCR_REPLICAS={best['replicas']} OCR_REPLICA_THREADS={best['threads']} "
+          f"({best['imagesPerSecond']} images/s)")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'cores': cores, 'results': results, 'best': best}, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
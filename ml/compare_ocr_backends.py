@@ -0,0 +1,109 @@
+"""
+Accuracy vs latency comparison of the TrOCR inference backends.
+
+Detects the lines of every sample image once, then recognizes the same
+crops with each backend. Latency is the recognition time per image and per
+line; accuracy is measured against the first backend listed (fp32 torch by
+default) as character error rate and the share of identical lines.
+
+Usage: python compare_ocr_backends.py samples/ [--backends torch int8 onnx] [--output report.json]
+"""
+import argparse
+import json
+import sys
+import time
+
+from ocr_backends import BACKENDS, load_recognition_model
+from ocr_batch import list_images
+from ocr_pipeline import OCRPipeline, read_image
+
+
+def edit_distance(a, b):
+    """Levenshtein distance between two strings."""
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1,
+                               previous[j - 1] + (char_a != char_b)))
+        previous = current
+    return previous[-1]
+
+
+def recognize_all(pipeline, documents):
+    """Recognizes every document's crops; returns texts and per-image seconds."""
+    # Untimed warm-up so one-off initialization is not charged to the first image
+    pipeline.recognize_lines(documents[0])
+    texts, seconds = [], []
+    for crops in documents:
+        started = time.perf_counter()
+        texts.append(pipeline.recognize_lines(crops))
+        seconds.append(time.perf_counter() - started)
+    return texts, seconds
+
+
+def compare(reference, texts):
+    """Character error rate and exact line match rate against the reference."""
+    errors = characters = matches = lines = 0
+    for reference_lines, lines_text in zip(reference, texts):
+        for expected, actual in zip(reference_lines, lines_text):
+            errors += edit_distance(expected, actual)
+            characters += len(expected)
+            matches += expected == actual
+            lines += 1
+    return {
+        'cer': round(errors / characters, 4) if characters else 0.0,
+        'lineMatchRate': round(matches / lines, 4) if lines else 1.0
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('source', help='Directory of sample images or manifest file')
+    parser.add_argument('--backends', nargs='+', choices=BACKENDS, default=list(BACKENDS))
+    parser.add_argument('--output', help='Write the report as JSON to this file')
+    args = parser.parse_args()
+
+    # Without the line cache every backend recognizes every crop
+    pipeline = OCRPipeline(backend=args.backends[0], line_cache_size=0)
+    documents = [pipeline.detect_lines(read_image(path)) for path in list_images(args.source)]
+    documents = [crops for crops in documents if crops]
+    if not documents:
+        print("No text lines detected in the sample images.")
+        return 1
+    line_count = sum(len(crops) for crops in documents)
+
+    report = {}
+    reference = None
+    for backend in args.backends:
+        started = time.perf_counter()
+        pipeline.model, pipeline.processor = load_recognition_model(pipeline.model_name, backend)
+        load_seconds = time.perf_counter() - started
+
+        texts, seconds = recognize_all(pipeline, documents)
+        if reference is None:
+            reference = texts
+        seconds.sort()
+        report[backend] = {
+            'loadMs': round(load_seconds * 1000, 1),
+            'msPerImage': round(sum(seconds) / len(seconds) * 1000, 1),
+            'p50MsPerImage': round(seconds[len(seconds) // 2] * 1000, 1),
+            'msPerLine': round(sum(seconds) / line_count * 1000, 2),
+            **compare(reference, texts)
+        }
+
+    baseline = report[args.backends[0]]['msPerImage']
+    print(f"{len(documents)} images, {line_count} lines; accuracy relative to {args.backends[0]}")
+    print(f"{'backend':>8} {'load ms':>9} {'ms/image':>9} {'ms/line':>8} {'speedup':>8} {'CER':>7} {'lines =':>8}")
+    for backend, row in report.items():
+        print(f"{backend:>8} {row['loadMs']:9.0f} {row['msPerImage']:9.1f} {row['msPerLine']:8.2f} "
+              f"{baseline / row['msPerImage']:7.2f}x {row['cer']:7.4f} {row['lineMatchRate']:8.2%}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,177 @@
+"""
+Asyncio (ASGI) variant of the genetic risk service.
+
+Scoring is CPU-bound, so each request is handed to a process pool and the
+event loop only parses and admits requests. Admission is bounded: once
+every worker is busy and the wait queue is full, new requests get 503 with
+a Retry-After estimate instead of queueing without limit.
+
+Usage: python asgi_app.py [--port 5003] or uvicorn asgi_app:app
+"""
+import argparse
+import asyncio
+import math
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Tuple
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import Route
+
+import json_codec
+from request_schema import SchemaError, validate_risk_request
+
+RISK_ASYNC_WORKERS = int(os.environ.get('RISK_ASYNC_WORKERS', multiprocessing.cpu_count()))
+RISK_ASYNC_QUEUE_SIZE = int(os.environ.get('RISK_ASYNC_QUEUE_SIZE', RISK_ASYNC_WORKERS * 4))
+
+
+def warm_up_worker():
+    # Compile the rule tables before the first request reaches the worker
+    import risk_assessment_api  # noqa: F401
+
+
+def score_request(patient_data: Dict[str, Any], family_history: List[Dict[str, Any]],
+                  compact: bool = False) -> Tuple[bytes, float]:
+    """
+    Score one request inside a pool worker
+    Returns the serialized response and the time spent scoring
+    """
+    from risk_assessment_api import compact_assessments, generate_risk_assessments
+
+    started = time.perf_counter()
+    risk_assessments = generate_risk_assessments(patient_data, family_history)
+    if compact:
+        risk_assessments = compact_assessments(risk_assessments)
+    body = json_codec.dumps(risk_assessments)
+    return body, time.perf_counter() - started
+
+
+class ScoringPool:
+    """
+    Process pool with bounded admission.
+    At most workers + queue_size requests are admitted at once; the average
+    scoring time is tracked to estimate when a rejected caller should retry.
+    """
+
+    def __init__(self, workers: int, queue_size: int):
+        self.workers = workers
+        self.capacity = workers + queue_size
+        self.in_flight = 0
+        self.average_latency = 0.05
+        self._executor = None
+
+    def start(self):
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=warm_up_worker)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def admit(self) -> bool:
+        """
+        Reserve a slot for a request, or return False when saturated
+        """
+        if self.in_flight >= self.capacity:
+            return False
+        self.in_flight += 1
+        return True
+
+    def release(self):
+        self.in_flight -= 1
+
+    def retry_after(self) -> int:
+        """
+        Estimate the seconds until the current backlog is drained
+        """
+        return max(1, math.ceil(self.in_flight * self.average_latency / self.workers))
+
+    async def score(self, patient_data: Dict[str, Any], family_history: List[Dict[str, Any]],
+                    compact: bool = False) -> bytes:
+        loop = asyncio.get_running_loop()
+        body, elapsed = await loop.run_in_executor(
+            self._executor, score_request, patient_data, family_history, compact)
+        # Exponentially weighted moving average of the scoring time
+        self.average_latency = 0.9 * self.average_latency + 0.1 * elapsed
+        return body
+
+
+def json_response(content: Any, status_code: int = 200, headers: Dict[str, str] = None) -> Response:
+    return Response(json_codec.dumps(content), status_code=status_code,
+                    headers=headers, media_type='application/json')
+
+
+async def analyze_genetic_risk(request: Request) -> Response:
+    pool = request.app.state.pool
+    if not pool.admit():
+        return json_response({'error': 'Service is at capacity, retry later'}, 503,
+                             headers={'Retry-After': str(pool.retry_after())})
+
+    try:
+        try:
+            data = json_codec.loads(await request.body())
+        except ValueError:
+            return json_response({'error': 'Invalid JSON body'}, 400)
+
+        # Validate input
+        try:
+            validate_risk_request(data)
+        except SchemaError as e:
+            return json_response({'error': f'Invalid input format: {e}'}, 400)
+
+        # Extract required data
+        patient_data = data.get('patientData', {})
+        family_history = data.get('familyHistory', [])
+
+        compact = request.query_params.get('compact', '').lower() in ('1', 'true')
+        body = await pool.score(patient_data, family_history, compact)
+        return Response(body, media_type='application/json')
+    except Exception as e:
+        print(f"Error processing risk assessment: {str(e)}")
+        return json_response({'error': str(e)}, 500)
+    finally:
+        pool.release()
+
+
+async def health(request: Request) -> Response:
+    pool = request.app.state.pool
+    return json_response({
+        'status': 'saturated' if pool.in_flight >= pool.capacity else 'ok',
+        'inFlight': pool.in_flight,
+        'capacity': pool.capacity,
+        'workers': pool.workers,
+        'averageLatencyMs': round(pool.average_latency * 1000, 2)
+    })
+
+
+@asynccontextmanager
+async def lifespan(app: Starlette):
+    app.state.pool = ScoringPool(RISK_ASYNC_WORKERS, RISK_ASYNC_QUEUE_SIZE)
+    app.state.pool.start()
+    try:
+        yield
+    finally:
+        app.state.pool.shutdown()
+
+
+app = Starlette(routes=[
+    Route('/api/risk-assessment', analyze_genetic_risk, methods=['POST']),
+    Route('/health', health, methods=['GET'])
+], lifespan=lifespan)
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--host', default=os.environ.get('RISK_API_HOST', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('RISK_API_PORT', 5003)))
+    args = parser.parse_args()
+
+    uvicorn.run(app, host=args.host, port=args.port, timeout_graceful_shutdown=30)
@@ -0,0 +1,241 @@
+"""
+Benchmark suite for the genetic risk service.
+
+Runs synthetic workloads of several sizes through the scalar engine, the
+vectorized engine and the HTTP endpoint (in process, through the Flask test
+client, so no server or network is needed) and reports p50/p99 latency
+and peak memory per scenario. Results can be saved and compared against a
+saved baseline to catch regressions; test_benchmark_regression.py runs
+the same check under pytest.
+
+Usage:
+    python benchmark.py [--iterations N] [--output results.json]
+    python benchmark.py --baseline results.json [--tolerance 0.25]
+    python benchmark.py --family-graph GENERATIONS CHILDREN
+"""
+import argparse
+import json
+import random
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+import risk_assessment_api
+from family_graph import FamilyGraph
+from risk_cache import ResultStore
+from workload import synthetic_family_graph, synthetic_request
+
+# Named workloads: (relatives, conditions per relative, records)
+SCENARIOS = {
+    'small': (5, 2, 10),
+    'medium': (25, 3, 100),
+    'large_family': (200, 5, 50),
+    'long_history': (10, 2, 2000)
+}
+
+TARGETS = ('scalar', 'vectorized', 'http')
+
+# Distinct requests cycled through per scenario, so no single input dominates
+REQUEST_POOL_SIZE = 8
+
+
+def clear_result_caches():
+    risk_assessment_api.PATIENT_BASE_CACHE.clear()
+    risk_assessment_api.RELATIVE_CONTRIBUTION_CACHE.clear()
+
+
+# Requests repeat, so the persistent result store would turn the http target
+# and the family graph comparison into SQLite lookups; keep it off
+risk_assessment_api.RESULT_STORE = ResultStore('', risk_assessment_api.RULES_VERSION)
+
+
+def make_runner(target: str, request: Dict[str, Any]) -> Callable[[], Any]:
+    """
+    Return a function scoring one request with the given target
+    """
+    patient_data = request['patientData']
+    family_history = request['familyHistory']
+
+    if target == 'scalar':
+        return lambda: risk_assessment_api.generate_risk_assessments_scalar(
+            patient_data, family_history)
+    if target == 'vectorized':
+        return lambda: risk_assessment_api.generate_risk_assessments_vectorized(
+            patient_data, family_history)
+
+    client = risk_assessment_api.app.test_client()
+    body = json.dumps(request)
+
+    def post():
+        response = client.post('/api/risk-assessment', data=body,
+                               content_type='application/json')
+        if response.status_code != 200:
+            raise RuntimeError(f"HTTP {response.status_code}: {response.get_data(as_text=True)}")
+        return response.get_data()
+    return post
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def measure(runners: List[Callable[[], Any]], iterations: int, warm: bool) -> Dict[str, float]:
+    """
+    Time the runners round-robin and measure peak memory of one pass
+    """
+    # Warm up imports, lazily built state and the condition index
+    for runner in runners:
+        runner()
+
+    latencies = []
+    for i in range(iterations):
+        if not warm:
+            clear_result_caches()
+        runner = runners[i % len(runners)]
+        started = time.perf_counter()
+        runner()
+        latencies.append(time.perf_counter() - started)
+
+    # tracemalloc slows allocation down, so memory is measured separately
+    if not warm:
+        clear_result_caches()
+    tracemalloc.start()
+    runners[0]()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies.sort()
+    return {
+        'p50Ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p99Ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'meanMs': round(sum(latencies) / len(latencies) * 1000, 3),
+        'peakMemoryKb': round(peak / 1024, 1)
+    }
+
+
+def run_benchmarks(scenarios: Dict[str, tuple], targets: List[str],
+                   iterations: int, warm: bool, seed: int) -> Dict[str, Dict[str, Dict[str, float]]]:
+    results = {}
+    for name, (relatives, conditions, records) in scenarios.items():
+        rng = random.Random(seed)
+        requests = [synthetic_request(rng, relatives, conditions, records)
+                    for _ in range(REQUEST_POOL_SIZE)]
+
+        results[name] = {}
+        for target in targets:
+            runners = [make_runner(target, request) for request in requests]
+            results[name][target] = measure(runners, iterations, warm)
+            print(f"{name:>14} {target:>10}: p50 {results[name][target]['p50Ms']:9.3f} ms"
+                  f"  p99 {results[name][target]['p99Ms']:9.3f} ms"
+                  f"  peak {results[name][target]['peakMemoryKb']:9.1f} KB", flush=True)
+    return results
+
+
+def compare_family_graph(generations: int, children: int, iterations: int, seed: int) -> Dict[str, Any]:
+    """
+    Time scoring a whole family with one family graph request against one
+    single-patient request per member
+    """
+    graph_request = synthetic_family_graph(random.Random(seed), generations, children)
+    graph = FamilyGraph(graph_request['members'], graph_request['edges'])
+    single_requests = [{
+        'patientData': {'conditions': member['conditions'], 'records': member['records']},
+        'familyHistory': graph.family_history(member_id)
+    } for member_id, member in graph.members.items()]
+
+    client = risk_assessment_api.app.test_client()
+    graph_body = json.dumps(graph_request)
+    single_bodies = [json.dumps(request) for request in single_requests]
+
+    def post(path, body):
+        response = client.post(path, data=body, content_type='application/json')
+        if response.status_code != 200:
+            raise RuntimeError(f"HTTP {response.status_code}: {response.get_data(as_text=True)}")
+
+    def graph_runner():
+        post('/api/risk-assessment/family-graph', graph_body)
+
+    def single_runner():
+        for body in single_bodies:
+            post('/api/risk-assessment', body)
+
+    results = {'members': len(single_requests)}
+    for name, runner in (('familyGraph', graph_runner), ('singleRequests', single_runner)):
+        results[name] = measure([runner], iterations, warm=False)
+        print(f"{name:>14} ({len(single_requests)} members): p50 {results[name]['p50Ms']:9.3f} ms"
+              f"  p99 {results[name]['p99Ms']:9.3f} ms", flush=True)
+    return results
+
+
+def find_regressions(results, baseline, tolerance: float) -> List[str]:
+    """
+    Compare p50 latencies against a baseline run
+    """
+    regressions = []
+    for name, targets in results.items():
+        for target, metrics in targets.items():
+            previous = baseline.get(name, {}).get(target)
+            if not previous:
+                continue
+            limit = previous['p50Ms'] * (1 + tolerance)
+            if metrics['p50Ms'] > limit:
+                regressions.append(
+                    f"{name}/{target}: p50 {metrics['p50Ms']} ms > {limit:.3f} ms "
+                    f"(baseline {previous['p50Ms']} ms)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS),
+                        help='Scenario to run, repeatable (default: all)')
+    parser.add_argument('--target', action='append', choices=TARGETS,
+                        help='Target to run, repeatable (default: all)')
+    parser.add_argument('--custom', nargs=3, type=int,
+                        metavar=('RELATIVES', 'CONDITIONS', 'RECORDS'),
+                        help='Add a custom scenario of the given size')
+    parser.add_argument('--family-graph', nargs=2, type=int,
+                        metavar=('GENERATIONS', 'CHILDREN'),
+                        help='Compare one family graph request with a request per member instead')
+    parser.add_argument('--warm', action='store_true',
+                        help='Keep the result caches between iterations')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    parser.add_argument('--baseline', help='Fail if p50 regresses against this results file')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='Allowed relative p50 slowdown against the baseline')
+    args = parser.parse_args()
+
+    if args.family_graph:
+        results = compare_family_graph(*args.family_graph, args.iterations, args.seed)
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(results, f, indent=2, sort_keys=True)
+        return 0
+
+    scenarios = {name: SCENARIOS[name] for name in (args.scenario or SCENARIOS)}
+    if args.custom:
+        scenarios['custom'] = tuple(args.custom)
+
+    results = run_benchmarks(scenarios, args.target or list(TARGETS),
+                             args.iterations, args.warm, args.seed)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = find_regressions(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
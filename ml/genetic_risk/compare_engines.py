@@ -0,0 +1,47 @@
+"""
+Equivalence check between the scalar and vectorized scoring engines.
+
+Generates random patients and family histories, scores each with both
+engines and compares the serialized JSON byte for byte.
+
+Usage: python compare_engines.py [--cases N] [--seed S]
+"""
+import argparse
+import json
+import random
+import sys
+
+from risk_assessment_api import (
+    generate_risk_assessments_scalar,
+    generate_risk_assessments_vectorized,
+)
+from workload import random_request
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--cases', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    mismatches = 0
+    for case in range(args.cases):
+        data = random_request(rng)
+        patient_data, family_history = data['patientData'], data['familyHistory']
+        scalar = json.dumps(generate_risk_assessments_scalar(
+            patient_data, family_history))
+        vectorized = json.dumps(generate_risk_assessments_vectorized(
+            patient_data, family_history))
+        if scalar != vectorized:
+            mismatches += 1
+            print(f"Mismatch in case {case}:")
+            print(json.dumps({'patientData': patient_data,
+                              'familyHistory': family_history}))
+
+    print(f"{args.cases - mismatches}/{args.cases} cases identical")
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,109 @@
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, List, Sequence, Tuple
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+# Relevance flags of a condition for a disease; a condition can be both
+# directly and indirectly related, so the flags are combined bitwise
+UNRELATED = 0
+INDIRECT = 1
+DIRECT = 2
+
+
+class TermMatcher:
+    """
+    Multi-pattern substring matcher reporting every term found in a text.
+    With pyahocorasick installed the terms are compiled into an Aho-Corasick
+    automaton that finds all (overlapping) occurrences in one pass over the
+    text. Without it, each term is searched with a C-level substring search,
+    which measured faster on long record texts than a single-pass regex.
+    """
+
+    def __init__(self, terms: Iterable[str]):
+        self.terms = tuple(dict.fromkeys(terms))
+        self._automaton = None
+        if ahocorasick is not None and self.terms:
+            automaton = ahocorasick.Automaton()
+            for term in self.terms:
+                automaton.add_word(term, term)
+            automaton.make_automaton()
+            self._automaton = automaton
+
+    def find_all(self, text: str) -> FrozenSet[str]:
+        """
+        Return the set of terms occurring anywhere in the text
+        """
+        if self._automaton is not None:
+            return frozenset(term for _, term in self._automaton.iter(text))
+        return frozenset(term for term in self.terms if term in text)
+
+
+class ConditionIndex:
+    """
+    Condition-to-disease relevance index compiled once from the rule tables.
+    A condition is classified against every disease in a single scan and the
+    resulting relevance row is kept in an LRU cache keyed by the normalized
+    (lower-cased) condition string.
+    """
+
+    def __init__(self, diseases: Sequence[str],
+                 related_condition_rules: Sequence[Tuple[str, Sequence[str]]],
+                 indirect_relations: Dict[str, List[str]],
+                 cache_size: int = 4096):
+        self.diseases = tuple(diseases)
+        self.positions = {disease: i for i, disease in enumerate(self.diseases)}
+        self._disease_lower = tuple(disease.lower() for disease in self.diseases)
+
+        # Condition terms implying a direct relation, per disease
+        self._direct_terms = []
+        for disease_lower in self._disease_lower:
+            terms = {disease_lower}
+            for condition_term, disease_terms in related_condition_rules:
+                if any(term in disease_lower for term in disease_terms):
+                    terms.add(condition_term)
+            self._direct_terms.append(frozenset(terms))
+
+        # Condition terms implying an indirect relation, per disease
+        self._indirect_terms = [
+            frozenset(indirect_relations.get(disease, []))
+            for disease in self.diseases
+        ]
+
+        self._matcher = TermMatcher(
+            set().union(*self._direct_terms, *self._indirect_terms))
+        self._classify_normalized = lru_cache(maxsize=cache_size)(
+            self._compile_row)
+
+    def _compile_row(self, condition_lower: str) -> Tuple[int, ...]:
+        """
+        Build the relevance row of a normalized condition for all diseases
+        """
+        found = self._matcher.find_all(condition_lower)
+
+        row = []
+        for i, disease_lower in enumerate(self._disease_lower):
+            relevance = UNRELATED
+            if condition_lower in disease_lower or found & self._direct_terms[i]:
+                relevance |= DIRECT
+            if found & self._indirect_terms[i]:
+                relevance |= INDIRECT
+            row.append(relevance)
+        return tuple(row)
+
+    def classify(self, condition: str) -> Tuple[int, ...]:
+        """
+        Return the relevance flags of a condition for every disease, in index order
+        """
+        return self._classify_normalized(condition.lower())
+
+    def relevance(self, condition: str, disease: str) -> int:
+        """
+        Return the relevance flags of a condition for a single indexed disease
+        """
+        return self.classify(condition)[self.positions[disease]]
+
+    def cache_info(self):
+        return self._classify_normalized.cache_info()
@@ -0,0 +1,201 @@
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from request_schema import SchemaError
+
+# Edge types of a family graph. 'parent' edges point from parent to child;
+# 'sibling' and 'spouse' edges are undirected, and sibling edges are
+# transitive: A-B and B-C make A and C siblings too. Siblings sharing a
+# recorded parent do not need an explicit edge.
+EDGE_TYPES = ('parent', 'sibling', 'spouse')
+
+# Relationship labels for (generations from the patient up to the closest
+# common ancestor, generations from the relative up to it)
+BLOOD_RELATIONSHIPS = {
+    (1, 0): 'parent',
+    (2, 0): 'grandparent',
+    (0, 1): 'child',
+    (0, 2): 'grandchild',
+    (1, 1): 'sibling'
+}
+
+# The same relationship seen from the relative's side
+INVERSE_RELATIONSHIPS = {
+    'parent': 'child',
+    'child': 'parent',
+    'grandparent': 'grandchild',
+    'grandchild': 'grandparent'
+}
+
+
+class FamilyGraph:
+    """
+    Family members connected by typed edges.
+    The relationship of every member to every other is derived from the
+    parent edges: each member's ancestors, with their distance in
+    generations, are computed once by a memoized upward traversal, and a
+    pair's relationship follows from its closest common ancestor. More
+    distant blood relatives (aunts, cousins, great-grandparents) and
+    in-laws reachable through the graph are labelled 'other'.
+    """
+
+    def __init__(self, members: List[Dict[str, Any]], edges: List[Dict[str, Any]]):
+        self.members = {}
+        for index, member in enumerate(members):
+            member_id = member.get('id')
+            if not member_id:
+                raise SchemaError(f'members[{index}].id is required')
+            if member_id in self.members:
+                raise SchemaError(f'members[{index}].id {member_id!r} is duplicated')
+            self.members[member_id] = member
+
+        self.parents: Dict[str, Set[str]] = {member_id: set() for member_id in self.members}
+        self.siblings: Dict[str, Set[str]] = {member_id: set() for member_id in self.members}
+        self.spouses: Dict[str, Set[str]] = {member_id: set() for member_id in self.members}
+        self.neighbours: Dict[str, Set[str]] = {member_id: set() for member_id in self.members}
+
+        for index, edge in enumerate(edges):
+            source, target, edge_type = edge.get('from'), edge.get('to'), edge.get('type', '').lower()
+            for end in (source, target):
+                if end not in self.members:
+                    raise SchemaError(f'edges[{index}] refers to unknown member {end!r}')
+            if source == target:
+                raise SchemaError(f'edges[{index}] connects a member to itself')
+            if edge_type not in EDGE_TYPES:
+                raise SchemaError(f'edges[{index}].type must be one of {", ".join(EDGE_TYPES)}')
+
+            if edge_type == 'parent':
+                self.parents[target].add(source)
+            elif edge_type == 'sibling':
+                self.siblings[source].add(target)
+                self.siblings[target].add(source)
+            else:
+                self.spouses[source].add(target)
+                self.spouses[target].add(source)
+            self.neighbours[source].add(target)
+            self.neighbours[target].add(source)
+
+        self._close_sibling_groups()
+
+        self._ancestors: Dict[str, Dict[str, int]] = {}
+        self._components: Dict[str, int] = {}
+        self._relationships: Dict[Tuple[str, str], Optional[str]] = {}
+
+    def _close_sibling_groups(self):
+        """
+        Make every member a sibling of all members reachable from it over
+        sibling edges
+        """
+        grouped: Set[str] = set()
+        for start in self.members:
+            if start in grouped or not self.siblings[start]:
+                continue
+            group = {start}
+            stack = [start]
+            while stack:
+                for sibling in self.siblings[stack.pop()]:
+                    if sibling not in group:
+                        group.add(sibling)
+                        stack.append(sibling)
+            for member_id in group:
+                self.siblings[member_id] = group - {member_id}
+            grouped |= group
+
+    def ancestors(self, member_id: str, _visiting: Optional[Set[str]] = None) -> Dict[str, int]:
+        """
+        Map every ancestor of a member, and the member itself, to its
+        distance in generations; memoized per member
+        """
+        if member_id in self._ancestors:
+            return self._ancestors[member_id]
+
+        visiting = _visiting if _visiting is not None else set()
+        if member_id in visiting:
+            raise SchemaError(f'parent edges form a cycle through member {member_id!r}')
+        visiting.add(member_id)
+
+        distances = {member_id: 0}
+        parents = set(self.parents[member_id])
+        # Explicit siblings share their parents
+        for sibling in self.siblings[member_id]:
+            parents |= self.parents[sibling]
+        for parent in parents:
+            for ancestor, distance in self.ancestors(parent, visiting).items():
+                if distance + 1 < distances.get(ancestor, distance + 2):
+                    distances[ancestor] = distance + 1
+
+        visiting.discard(member_id)
+        self._ancestors[member_id] = distances
+        return distances
+
+    def component(self, member_id: str) -> int:
+        """
+        Return the index of the connected part of the graph holding a member
+        """
+        if not self._components:
+            for start in self.members:
+                if start in self._components:
+                    continue
+                label = len(set(self._components.values()))
+                stack = [start]
+                while stack:
+                    current = stack.pop()
+                    if current not in self._components:
+                        self._components[current] = label
+                        stack.extend(self.neighbours[current])
+        return self._components[member_id]
+
+    def relationship(self, patient_id: str, relative_id: str) -> Optional[str]:
+        """
+        Relationship label of a relative as seen from the patient, or None
+        when the two are not connected
+        """
+        key = (patient_id, relative_id)
+        if key in self._relationships:
+            return self._relationships[key]
+
+        label = None
+        if relative_id in self.siblings[patient_id]:
+            label = 'sibling'
+        elif relative_id in self.spouses[patient_id]:
+            label = 'spouse'
+        else:
+            patient_ancestors = self.ancestors(patient_id)
+            relative_ancestors = self.ancestors(relative_id)
+            closest = min(
+                ((distance, relative_ancestors[ancestor])
+                 for ancestor, distance in patient_ancestors.items()
+                 if ancestor in relative_ancestors),
+                key=sum, default=None)
+            if closest is not None:
+                label = BLOOD_RELATIONSHIPS.get(closest, 'other')
+            elif self.component(patient_id) == self.component(relative_id):
+                label = 'other'
+
+        # Every pair is derived once; the reverse direction is its inverse
+        self._relationships[key] = label
+        self._relationships[(relative_id, patient_id)] = INVERSE_RELATIONSHIPS.get(label, label)
+        return label
+
+    def relatives(self, patient_id: str) -> Iterator[Tuple[Dict[str, Any], str]]:
+        """
+        Yield (member, relationship) for every member connected to the patient
+        """
+        for member_id, member in self.members.items():
+            if member_id == patient_id:
+                continue
+            relationship = self.relationship(patient_id, member_id)
+            if relationship is not None:
+                yield member, relationship
+
+    def family_history(self, patient_id: str) -> List[Dict[str, Any]]:
+        """
+        Return the patient's relatives in the familyHistory request format
+        """
+        return [
+            {
+                'userId': member['id'],
+                'relationship': relationship,
+                'conditions': member.get('conditions', [])
+            }
+            for member, relationship in self.relatives(patient_id)
+        ]
@@ -0,0 +1,71 @@
+"""
+JSON codec for the genetic risk service.
+
+Uses orjson when it is installed (and RISK_JSON_CODEC is not 'json'),
+falling back to the standard library. Keys are always sorted so both codecs
+produce the same key order as Flask's default jsonify.
+"""
+import json
+import os
+from typing import Any
+
+from flask import Response
+from flask.json.provider import DefaultJSONProvider
+
+RISK_JSON_CODEC = os.environ.get('RISK_JSON_CODEC', 'auto')
+if RISK_JSON_CODEC not in ('auto', 'orjson', 'json'):
+    raise ValueError(f"Unknown RISK_JSON_CODEC: {RISK_JSON_CODEC}")
+
+orjson = None
+if RISK_JSON_CODEC != 'json':
+    try:
+        import orjson
+    except ImportError:
+        if RISK_JSON_CODEC == 'orjson':
+            raise
+
+CODEC_NAME = 'orjson' if orjson is not None else 'json'
+
+
+def loads(data: Any) -> Any:
+    """
+    Parse JSON from str or bytes
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(value: Any) -> bytes:
+    """
+    Serialize a value to compact UTF-8 JSON with sorted keys
+    """
+    if orjson is not None:
+        return orjson.dumps(value, option=orjson.OPT_SORT_KEYS)
+    return json.dumps(value, sort_keys=True, separators=(',', ':'),
+                      ensure_ascii=False).encode('utf-8')
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider backed by the configured codec, so request.json and
+    jsonify use it without changes to the routes
+    """
+
+    def loads(self, s, **kwargs):
+        if orjson is not None and not kwargs:
+            return orjson.loads(s)
+        return super().loads(s, **kwargs)
+
+    def dumps(self, obj, **kwargs):
+        if orjson is not None and not kwargs:
+            return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS).decode('utf-8')
+        return super().dumps(obj, **kwargs)
+
+    def response(self, *args, **kwargs) -> Response:
+        if orjson is None:
+            return super().response(*args, **kwargs)
+        # Skip the str round trip and hand orjson's bytes straight to Flask
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(
+            orjson.dumps(obj, option=orjson.OPT_SORT_KEYS), mimetype=self.mimetype)
@@ -0,0 +1,164 @@
+"""
+Load test for the genetic risk service.
+
+Sends risk assessment requests over keep-alive connections from several
+client processes and reports throughput and latency percentiles. With
+--compare it starts the development server (python risk_assessment_api.py)
+and the production server (python serve.py) in turn and tests both.
+
+The same payload is sent over and over; test a server started with
+RISK_STORE_PATH set and every request after the first is a store hit.
+
+Usage:
+    python loadtest.py --url http://localhost:5001 [--requests N] [--concurrency C]
+    python loadtest.py --compare [--workers W] [--threads T]
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import signal
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlparse
+
+from workload import synthetic_request
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def build_payload(relatives: int) -> bytes:
+    """
+    Build a deterministic risk assessment request with the given family size
+    """
+    return json.dumps(synthetic_request(random.Random(0), relatives=relatives)).encode('utf-8')
+
+
+def run_client(url: str, path: str, payload: bytes, requests: int):
+    """
+    Send requests sequentially over one keep-alive connection
+    Returns the list of latencies in seconds and the number of errors
+    """
+    target = urlparse(url)
+    connection = http.client.HTTPConnection(target.hostname, target.port, timeout=60)
+    headers = {'Content-Type': 'application/json'}
+    latencies = []
+    errors = 0
+
+    for _ in range(requests):
+        started = time.perf_counter()
+        try:
+            connection.request('POST', path, body=payload, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            if response.status != 200:
+                errors += 1
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            connection.close()
+            connection = http.client.HTTPConnection(target.hostname, target.port, timeout=60)
+        latencies.append(time.perf_counter() - started)
+
+    connection.close()
+    return latencies, errors
+
+
+def percentile(sorted_values, fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run_load(url: str, path: str, payload: bytes, requests: int, concurrency: int):
+    """
+    Run the load test and return a summary dict
+    """
+    per_client = max(1, requests // concurrency)
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(run_client, [url] * concurrency, [path] * concurrency,
+                                [payload] * concurrency, [per_client] * concurrency))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for client, _ in results for latency in client)
+    errors = sum(client_errors for _, client_errors in results)
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'seconds': round(elapsed, 3),
+        'throughput': round(len(latencies) / elapsed, 1),
+        'p50Ms': round(percentile(latencies, 0.50) * 1000, 2),
+        'p99Ms': round(percentile(latencies, 0.99) * 1000, 2)
+    }
+
+
+def wait_until_ready(url: str, path: str, payload: bytes, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        _, errors = run_client(url, path, payload, 1)
+        if not errors:
+            return
+        time.sleep(0.2)
+    raise RuntimeError(f"Server at {url} did not become ready")
+
+
+def run_server(command, port: int, args, payload: bytes):
+    """
+    Start a server in its own process group, load test it and stop it
+    """
+    url = f'http://127.0.0.1:{port}'
+    # The payload repeats, so a persistent result store would answer every
+    # request after the first without scoring it
+    env = {**os.environ, 'RISK_STORE_PATH': ''}
+    process = subprocess.Popen(command, cwd=HERE, env=env, start_new_session=True,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_until_ready(url, args.path, payload)
+        # Warm up every worker before measuring
+        run_load(url, args.path, payload, args.concurrency * 5, args.concurrency)
+        return run_load(url, args.path, payload, args.requests, args.concurrency)
+    finally:
+        # The development server's reloader runs the app in a child process
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--url', default='http://localhost:5001')
+    parser.add_argument('--path', default='/api/risk-assessment')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=os.cpu_count() * 2)
+    parser.add_argument('--relatives', type=int, default=20,
+                        help='Family size of the request payload')
+    parser.add_argument('--compare', action='store_true',
+                        help='Start and compare the development and production servers')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help='Production server workers when comparing')
+    parser.add_argument('--threads', type=int, default=1,
+                        help='Production server threads per worker when comparing')
+    args = parser.parse_args()
+
+    payload = build_payload(args.relatives)
+
+    if not args.compare:
+        print(json.dumps(run_load(args.url, args.path, payload,
+                                  args.requests, args.concurrency), indent=2))
+        return
+
+    results = {
+        'development': run_server(
+            [sys.executable, 'risk_assessment_api.py'], 5001, args, payload),
+        'production': run_server(
+            [sys.executable, 'serve.py', '--port', '5002', '--workers', str(args.workers),
+             '--threads', str(args.threads)], 5002, args, payload)
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
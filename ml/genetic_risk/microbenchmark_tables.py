@@ -0,0 +1,75 @@
+"""
+Micro-benchmark of per-request output assembly.
+
+Compares building factors and recommendations for all diseases the way the
+service used to (rebuilding strings per call, O(n^2) list deduplication)
+with the precomputed tables and ordered-set deduplication.
+
+Usage: python microbenchmark_tables.py [--repeat N]
+"""
+import argparse
+import timeit
+
+from risk_assessment_api import (
+    DISEASES,
+    append_unique,
+    build_disease_factors,
+    build_recommendations,
+    extract_risk_factors,
+    generate_recommendations,
+    get_evidence_based_factors,
+    is_condition_related_to_disease,
+    recommendation_band,
+)
+
+PATIENT_CONDITIONS = ['Hypertension', 'High cholesterol']
+RECORD_FACTORS = ['Cholesterol issues', 'Blood pressure issues', 'Cholesterol issues',
+                  'Blood pressure issues', 'Blood sugar abnormalities']
+RISK_PERCENTAGES = [12, 35, 48, 71, 25, 60, 9, 33, 80, 44]
+
+
+def assemble_rebuilt():
+    for disease, risk_percentage in zip(DISEASES, RISK_PERCENTAGES):
+        factors = ['Age']
+        for condition in PATIENT_CONDITIONS:
+            if is_condition_related_to_disease(condition, disease):
+                factors.append(f'Existing diagnosis of {condition}')
+        factors.extend(build_disease_factors(disease))
+        for factor in RECORD_FACTORS:
+            if factor not in factors:
+                factors.append(factor)
+        if risk_percentage > 30:
+            for factor in list(get_evidence_based_factors(disease)):
+                if factor not in factors:
+                    factors.append(factor)
+        build_recommendations(disease, recommendation_band(risk_percentage))
+
+
+def assemble_tables():
+    for disease, risk_percentage in zip(DISEASES, RISK_PERCENTAGES):
+        factors = extract_risk_factors(disease, PATIENT_CONDITIONS)
+        seen_factors = set(factors)
+        append_unique(factors, seen_factors, RECORD_FACTORS)
+        if risk_percentage > 30:
+            append_unique(factors, seen_factors, get_evidence_based_factors(disease))
+        generate_recommendations(disease, risk_percentage)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--repeat', type=int, default=20000)
+    args = parser.parse_args()
+
+    results = {}
+    for name, function in (('rebuilt', assemble_rebuilt), ('tables', assemble_tables)):
+        best = min(timeit.repeat(function, number=args.repeat, repeat=5))
+        results[name] = best / args.repeat * 1e6
+        print(f"{name:>8}: {results[name]:8.2f} us per request")
+
+    saved = results['rebuilt'] - results['tables']
+    print(f"   saved: {saved:8.2f} us per request "
+          f"({saved / results['rebuilt'] * 100:.0f}%)")
+
+
+if __name__ == '__main__':
+    main()
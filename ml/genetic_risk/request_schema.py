@@ -0,0 +1,150 @@
+from typing import Any, Callable, Dict
+
+# Validators take a value and the path of the value in the request
+Validator = Callable[[Any, str], None]
+
+
+class SchemaError(ValueError):
+    """
+    Raised when a request does not match its schema
+    """
+
+
+def compile_schema(schema: Dict[str, Any]) -> Callable[[Any], None]:
+    """
+    Compile a schema into a validator function
+    Schemas are dicts with a 'type' of 'object', 'array', 'string' or 'any';
+    objects list their optional 'properties' and arrays their 'items'.
+    Unknown object keys are allowed. The schema is walked once here, so
+    validating a request is a chain of direct isinstance checks.
+    """
+    validator = _compile(schema)
+
+    def validate(value: Any, path: str = ''):
+        validator(value, path)
+
+    return validate
+
+
+def _compile(schema: Dict[str, Any]) -> Validator:
+    schema_type = schema.get('type', 'any')
+
+    if schema_type == 'any':
+        return lambda value, path: None
+
+    if schema_type == 'string':
+        def validate_string(value, path):
+            if not isinstance(value, str):
+                raise SchemaError(f"{path or 'value'} must be a string")
+        return validate_string
+
+    if schema_type == 'array':
+        items = schema.get('items', {'type': 'any'})
+
+        if items.get('type') == 'string':
+            # Lists of strings are the bulk of a request; check them in one pass
+            def validate_strings(value, path):
+                if not isinstance(value, list):
+                    raise SchemaError(f"{path or 'value'} must be an array")
+                if not all(isinstance(item, str) for item in value):
+                    index = next(i for i, item in enumerate(value) if not isinstance(item, str))
+                    raise SchemaError(f"{path}[{index}] must be a string")
+            return validate_strings
+
+        validate_item = _compile(items)
+
+        def validate_array(value, path):
+            if not isinstance(value, list):
+                raise SchemaError(f"{path or 'value'} must be an array")
+            for index, item in enumerate(value):
+                validate_item(item, f"{path}[{index}]")
+        return validate_array
+
+    if schema_type == 'object':
+        properties = tuple(
+            (name, _compile(property_schema))
+            for name, property_schema in schema.get('properties', {}).items()
+        )
+
+        def validate_object(value, path):
+            if not isinstance(value, dict):
+                raise SchemaError(f"{path or 'value'} must be an object")
+            prefix = f"{path}." if path else ''
+            for name, validate_property in properties:
+                if name in value:
+                    validate_property(value[name], prefix + name)
+        return validate_object
+
+    raise ValueError(f"Unsupported schema type: {schema_type}")
+
+
+STRING_LIST = {'type': 'array', 'items': {'type': 'string'}}
+
+RECORD_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'recordType': {'type': 'string'},
+        'title': {'type': 'string'},
+        'description': {'type': 'string'}
+    }
+}
+
+PATIENT_DATA_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'conditions': STRING_LIST,
+        'records': {'type': 'array', 'items': RECORD_SCHEMA}
+    }
+}
+
+FAMILY_HISTORY_SCHEMA = {
+    'type': 'array',
+    'items': {
+        'type': 'object',
+        'properties': {
+            'relationship': {'type': 'string'},
+            'conditions': STRING_LIST
+        }
+    }
+}
+
+RISK_REQUEST_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'patientData': PATIENT_DATA_SCHEMA,
+        'familyHistory': FAMILY_HISTORY_SCHEMA
+    }
+}
+
+FAMILY_GRAPH_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'members': {
+            'type': 'array',
+            'items': {
+                'type': 'object',
+                'properties': {
+                    'id': {'type': 'string'},
+                    'conditions': STRING_LIST,
+                    'records': {'type': 'array', 'items': RECORD_SCHEMA}
+                }
+            }
+        },
+        'edges': {
+            'type': 'array',
+            'items': {
+                'type': 'object',
+                'properties': {
+                    'from': {'type': 'string'},
+                    'to': {'type': 'string'},
+                    'type': {'type': 'string'}
+                }
+            }
+        },
+        'targets': STRING_LIST
+    }
+}
+
+validate_risk_request = compile_schema(RISK_REQUEST_SCHEMA)
+validate_family_graph = compile_schema(FAMILY_GRAPH_SCHEMA)
+validate_record = compile_schema(RECORD_SCHEMA)
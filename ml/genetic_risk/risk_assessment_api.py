@@ -1,9 +1,18 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
+import hashlib
 import numpy as np
-import random
-from typing import Dict, List, Any
+import os
+from typing import Callable, Dict, Iterable, Iterator, List, Any, Optional, Set, Tuple
+
+import json_codec
+from condition_index import ConditionIndex, TermMatcher, DIRECT, INDIRECT
+from family_graph import FamilyGraph
+from request_schema import SchemaError, validate_family_graph, validate_record, validate_risk_request
+from risk_cache import ResultCache, ResultStore, content_hash
+from vectorized_engine import VectorizedRiskEngine
 
 app = Flask(__name__)
+app.json = json_codec.FastJSONProvider(app)
 
 # Disease definitions
 DISEASES = [
@@ -30,45 +39,472 @@ RELATIONSHIP_IMPACT = {
     'other': 1
 }
 
+# Genetic significance multipliers by relationship type
+GENETIC_SIGNIFICANCE = {
+    # First-degree relatives have higher genetic significance
+    'parent': 1.4,
+    'sibling': 1.4,
+    'child': 1.4,
+    # Second-degree relatives have moderate genetic significance
+    'grandparent': 1.2,
+    'grandchild': 1.2
+}
+
+# Baseline risk that varies by disease
+DISEASE_BASELINE = {
+    'Cardiovascular Disease': 10.0,
+    'Type 2 Diabetes': 8.0,
+    'Breast Cancer': 6.0,
+    'Colorectal Cancer': 5.0,
+    'Alzheimer\'s Disease': 7.0,
+    'Hypertension': 12.0,
+    'Asthma': 6.0,
+    'Depression': 8.0,
+    'Rheumatoid Arthritis': 5.0,
+    'Osteoporosis': 7.0
+}
+
+# Evidence-based risk factors added for high-risk patients
+EVIDENCE_BASED_FACTORS = {
+    'Cardiovascular Disease': ('Family history', 'Lifestyle factors', 'Diet and exercise habits'),
+    'Type 2 Diabetes': ('Family history', 'Weight management', 'Physical activity level'),
+    'Breast Cancer': ('Family history', 'Age', 'Reproductive history'),
+    'Colorectal Cancer': ('Family history', 'Diet patterns', 'Screening history'),
+    'Alzheimer\'s Disease': ('Family history', 'Cognitive activity', 'Social engagement'),
+    'Hypertension': ('Family history', 'Sodium intake', 'Stress levels'),
+    'Asthma': ('Family history', 'Environmental exposures', 'Allergies'),
+    'Depression': ('Family history', 'Stress factors', 'Previous episodes'),
+    'Rheumatoid Arthritis': ('Family history', 'Environmental factors'),
+    'Osteoporosis': ('Family history', 'Calcium intake', 'Exercise patterns')
+}
+
+# Risk indicators found in patient records: (terms, diseases, factor)
+# Each indicator adds its factor at most once per record
+RECORD_RISK_INDICATORS = (
+    (('cholesterol',), ('Cardiovascular Disease',), 'Cholesterol issues'),
+    (('blood pressure', 'hypertension'), ('Cardiovascular Disease',), 'Blood pressure issues'),
+    (('glucose', 'sugar', 'a1c', 'insulin'), ('Type 2 Diabetes',), 'Blood sugar abnormalities'),
+    (('tumor', 'growth', 'mass', 'biopsy'), ('Breast Cancer', 'Colorectal Cancer'), 'Previous suspicious findings'),
+    (('cognitive', 'memory'), ('Alzheimer\'s Disease',), 'Cognitive concerns'),
+    (('joint', 'arthritis'), ('Rheumatoid Arthritis',), 'Joint issues'),
+    (('bone', 'density'), ('Osteoporosis',), 'Bone health concerns')
+)
+
+# Recommendation bands by minimum risk percentage, highest first
+RECOMMENDATION_BANDS = (
+    ('high', 70),
+    ('moderate', 40),
+    ('standard', 0)
+)
+
+# Disease-specific family history weight
+FAMILY_HISTORY_WEIGHT = {
+    'Breast Cancer': 2.0,         # Strong genetic component
+    'Colorectal Cancer': 1.8,     # Strong genetic component
+    'Alzheimer\'s Disease': 1.7,  # Significant genetic component
+    'Type 2 Diabetes': 1.5,       # Moderate genetic component
+    'Cardiovascular Disease': 1.5,  # Moderate genetic component
+    'Rheumatoid Arthritis': 1.3,  # Some genetic component
+    'Hypertension': 1.2,          # Some genetic component
+    'Osteoporosis': 1.2,          # Some genetic component
+    'Asthma': 1.1,                # Some genetic component
+    'Depression': 1.0             # Less strong genetic component
+}
+
+# Condition terms directly related to diseases whose name contains any of the given terms
+RELATED_CONDITION_RULES = [
+    ('heart', ['cardiovascular']),
+    ('sugar', ['diabetes']),
+    ('blood pressure', ['cardiovascular', 'hypertension']),
+    ('dementia', ['alzheimer'])
+]
+
+# Map diseases to indirectly related conditions
+INDIRECT_RELATIONS = {
+    'Cardiovascular Disease': ['diabetes', 'obesity', 'kidney', 'cholesterol'],
+    'Type 2 Diabetes': ['obesity', 'cardiovascular', 'hypertension'],
+    'Breast Cancer': ['hormonal', 'ovarian'],
+    'Colorectal Cancer': ['polyps', 'inflammatory bowel', 'crohn', 'colitis'],
+    'Alzheimer\'s Disease': ['cardiovascular', 'diabetes', 'depression'],
+    'Hypertension': ['kidney', 'thyroid', 'sleep apnea'],
+    'Asthma': ['allergies', 'eczema', 'respiratory'],
+    'Depression': ['anxiety', 'bipolar', 'sleep disorder'],
+    'Rheumatoid Arthritis': ['lupus', 'psoriasis', 'inflammatory'],
+    'Osteoporosis': ['hormonal', 'celiac', 'inflammatory']
+}
+
+# Rule tables compiled once at startup; conditions are classified against
+# all diseases in one scan and cached per normalized condition string
+CONDITION_INDEX = ConditionIndex(
+    DISEASES, RELATED_CONDITION_RULES, INDIRECT_RELATIONS)
+
+# Scoring engine used by generate_risk_assessments: 'scalar' or 'vectorized'
+SCORING_ENGINE = os.environ.get('RISK_SCORING_ENGINE', 'scalar')
+if SCORING_ENGINE not in ('scalar', 'vectorized'):
+    raise ValueError(f"Unknown RISK_SCORING_ENGINE: {SCORING_ENGINE}")
+
+VECTORIZED_ENGINE = VectorizedRiskEngine(
+    DISEASES, RELATIONSHIP_IMPACT, GENETIC_SIGNIFICANCE,
+    DISEASE_BASELINE, FAMILY_HISTORY_WEIGHT)
+
+# Bounded caches of per-patient base risk and per-relative contributions,
+# so requests differing only by a relative or condition recompute only the
+# affected terms. RISK_CACHE_SIZE=0 disables them.
+RISK_CACHE_SIZE = int(os.environ.get('RISK_CACHE_SIZE', 10000))
+RISK_CACHE_TTL = float(os.environ.get('RISK_CACHE_TTL', 3600))
+PATIENT_BASE_CACHE = ResultCache(RISK_CACHE_SIZE, RISK_CACHE_TTL)
+RELATIVE_CONTRIBUTION_CACHE = ResultCache(RISK_CACHE_SIZE, RISK_CACHE_TTL)
+
+# Persistent store of whole responses, keyed by the canonical request and
+# RULES_VERSION (set up at the end of the module). Responses hold patient
+# data, so the store is off unless RISK_STORE_PATH names a database file,
+# and rows expire after RISK_STORE_TTL seconds.
+RISK_STORE_PATH = os.environ.get('RISK_STORE_PATH', '')
+RISK_STORE_MAX_ENTRIES = int(os.environ.get('RISK_STORE_MAX_ENTRIES', 100000))
+RISK_STORE_TTL = float(os.environ.get('RISK_STORE_TTL', 86400))
+
+# All record indicator terms compiled into one scanner
+RECORD_MATCHER = TermMatcher(
+    term for terms, _, _ in RECORD_RISK_INDICATORS for term in terms)
+RECORD_TERM_INDICATORS = {}
+for indicator_index, (terms, _, _) in enumerate(RECORD_RISK_INDICATORS):
+    for term in terms:
+        RECORD_TERM_INDICATORS.setdefault(term, []).append(indicator_index)
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
 
 @app.route('/api/risk-assessment', methods=['POST'])
 def analyze_genetic_risk():
+    """
+    Score one patient
+    With ?compact=1, factors and recommendations found in the string
+    dictionary are returned as integer IDs into it. NDJSON requests send the
+    request object without records on the first line followed by one record
+    per line; records are then parsed lazily instead of materialized.
+    JSON requests are answered from the result store when the same request
+    was scored before under the current rules, and carry an ETag for
+    conditional requests.
+    """
     try:
-        data = request.json
+        compact = wants_compact_response()
+        headers = {'X-Dictionary-Version': STRING_TABLE_VERSION} if compact else {}
+
+        if request.mimetype == NDJSON_MIMETYPE:
+            data = read_streamed_request(request.stream)
+        else:
+            # Malformed JSON is reported as an invalid object below
+            data = request.get_json(silent=True)
+
+            # Validate input
+            validate_risk_request(data)
+
+            return stored_json_response(
+                ['risk-assessment', compact, data],
+                lambda: score_patient(data.get('patientData', {}), data.get('familyHistory', []), compact),
+                headers)
 
         # Extract required data
         patient_data = data.get('patientData', {})
         family_history = data.get('familyHistory', [])
 
-        # Validate input
-        if not isinstance(patient_data, dict) or not isinstance(family_history, list):
-            return jsonify({'error': 'Invalid input format'}), 400
+        response = jsonify(score_patient(patient_data, family_history, compact))
+        response.headers.update(headers)
+        return response
+    except SchemaError as e:
+        return jsonify({'error': f'Invalid input format: {e}'}), 400
+    except Exception as e:
+        print(f"Error processing risk assessment: {str(e)}")
+        return jsonify({'error': str(e)}), 500
 
-        # Generate risk assessments
-        risk_assessments = generate_risk_assessments(
-            patient_data, family_history)
 
-        return jsonify(risk_assessments)
+@app.route('/api/risk-assessment/batch', methods=['POST'])
+def analyze_genetic_risk_batch():
+    """
+    Score many patients in one request
+    Accepts {"patients": [...]} as JSON, or one patient object per line as
+    NDJSON. Each patient object has the same patientData/familyHistory fields
+    as /api/risk-assessment plus an optional patientId. NDJSON requests, or
+    requests sending Accept: application/x-ndjson, get one result per line
+    streamed back as soon as it is scored. ?compact=1 applies to every result.
+    """
+    try:
+        # Relatives shared between patients of the batch (siblings, parents
+        # and children in the same family) are classified only once
+        classification_cache = {}
+
+        if request.mimetype == NDJSON_MIMETYPE:
+            patients = (line for line in request.stream if line.strip())
+        else:
+            # Malformed JSON is reported as an invalid object below
+            data = request.get_json(silent=True)
+            patients = data.get('patients') if isinstance(data, dict) else None
+            if not isinstance(patients, list):
+                return jsonify({'error': 'Invalid input format'}), 400
+
+        compact = wants_compact_response()
+        results = (assess_batch_entry(entry, classification_cache, compact)
+                   for entry in patients)
+
+        if request.mimetype == NDJSON_MIMETYPE or request.accept_mimetypes.best == NDJSON_MIMETYPE:
+            response = Response(stream_with_context(
+                json_codec.dumps(result) + b'\n' for result in results),
+                mimetype=NDJSON_MIMETYPE)
+        else:
+            response = jsonify({'results': list(results)})
+
+        if compact:
+            response.headers['X-Dictionary-Version'] = STRING_TABLE_VERSION
+        return response
     except Exception as e:
-        print(f"Error processing risk assessment: {str(e)}")
+        print(f"Error processing batch risk assessment: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/risk-assessment/family-graph', methods=['POST'])
+def analyze_family_graph():
+    """
+    Score every member of a family in one request
+    Accepts {"members": [{"id", "conditions", "records"}], "edges":
+    [{"from", "to", "type"}]} where type is 'parent' (from is a parent of
+    to), 'sibling' or 'spouse'. Each member is scored against all the
+    others it is connected to, with relationships derived from the graph;
+    an optional "targets" list limits which members are scored.
+    ?compact=1 applies to every result.
+    """
+    try:
+        data = request.get_json(silent=True)
+        validate_family_graph(data)
+        if not isinstance(data.get('members'), list):
+            raise SchemaError('members must be an array')
+
+        graph = FamilyGraph(data['members'], data.get('edges', []))
+        targets = data.get('targets', list(graph.members))
+        for target in targets:
+            if target not in graph.members:
+                raise SchemaError(f'targets refers to unknown member {target!r}')
+
+        compact = wants_compact_response()
+
+        def score_members() -> Dict[str, Any]:
+            # Each member's conditions are classified once and reused in the
+            # family history of every other member
+            classification_cache = {}
+            results = []
+            for member_id in targets:
+                member = graph.members[member_id]
+                risk_assessments = generate_risk_assessments(
+                    {'conditions': member.get('conditions', []), 'records': member.get('records', [])},
+                    graph.family_history(member_id), classification_cache)
+                if compact:
+                    risk_assessments = compact_assessments(risk_assessments)
+                results.append({'memberId': member_id, 'riskAssessments': risk_assessments})
+            return {'results': results}
+
+        return stored_json_response(
+            ['family-graph', compact, data], score_members,
+            {'X-Dictionary-Version': STRING_TABLE_VERSION} if compact else {})
+    except SchemaError as e:
+        return jsonify({'error': f'Invalid input format: {e}'}), 400
+    except Exception as e:
+        print(f"Error processing family graph risk assessment: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
 
-def generate_risk_assessments(patient_data: Dict[str, Any], family_history: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+@app.route('/api/risk-assessment/dictionary', methods=['GET'])
+def risk_string_dictionary():
+    """
+    Return the string dictionary used by compact responses
+    IDs are indexes into 'strings'; clients fetch it once per version
+    """
+    response = jsonify({'version': STRING_TABLE_VERSION, 'strings': STRING_TABLE})
+    response.set_etag(STRING_TABLE_VERSION)
+    return response.make_conditional(request)
+
+
+@app.route('/api/risk-assessment/cache-stats', methods=['GET'])
+def risk_cache_stats():
+    """
+    Report hit/miss metrics of the risk assessment caches
+    """
+    condition_cache = CONDITION_INDEX.cache_info()
+    return jsonify({
+        'patientBase': PATIENT_BASE_CACHE.stats(),
+        'relativeContributions': RELATIVE_CONTRIBUTION_CACHE.stats(),
+        'conditionIndex': {
+            'size': condition_cache.currsize,
+            'maxsize': condition_cache.maxsize,
+            'hits': condition_cache.hits,
+            'misses': condition_cache.misses
+        },
+        'resultStore': RESULT_STORE.stats()
+    })
+
+
+def score_patient(patient_data: Dict[str, Any], family_history: List[Dict[str, Any]],
+                  compact: bool = False) -> List[Dict[str, Any]]:
+    risk_assessments = generate_risk_assessments(patient_data, family_history)
+    if compact:
+        return compact_assessments(risk_assessments)
+    return risk_assessments
+
+
+def stored_json_response(request_value: Any, compute: Callable[[], Any],
+                         headers: Optional[Dict[str, str]] = None) -> Response:
+    """
+    Serve a JSON response through the result store
+    The ETag is the store key, a hash of the canonical request and
+    RULES_VERSION, so a client repeating a request with If-None-Match gets
+    304 Not Modified without anything being scored or read from the store.
+    RFC 9110 answers a matching If-None-Match on POST with 412; these POSTs
+    only carry a query and change nothing, so they are answered like a GET.
+    The wildcard "*" is ignored: it would match every request unscored.
+    """
+    key = RESULT_STORE.key(request_value)
+    if key in request.if_none_match.as_set(include_weak=True):
+        response = Response(status=304)
+    else:
+        body = RESULT_STORE.get_or_compute(key, lambda: json_codec.dumps(compute()))
+        response = Response(body, mimetype='application/json')
+    response.set_etag(key)
+    response.headers.update(headers or {})
+    return response
+
+
+def read_streamed_request(stream: Iterable[bytes]) -> Dict[str, Any]:
+    """
+    Read an NDJSON risk request
+    The first line holds the request object, each further line one record
+    of the patient. The returned patientData.records is a generator, so
+    records are parsed and validated only as they are analyzed.
+    """
+    lines = (line for line in stream if line.strip())
+    try:
+        data = json_codec.loads(next(lines, b'{}'))
+    except ValueError:
+        raise SchemaError('request object is not valid JSON')
+    validate_risk_request(data)
+
+    patient_data = dict(data.get('patientData', {}))
+    patient_data['records'] = iter_streamed_records(lines)
+    return {**data, 'patientData': patient_data}
+
+
+def iter_streamed_records(lines: Iterable[bytes]) -> Iterator[Dict[str, Any]]:
+    for index, line in enumerate(lines):
+        try:
+            record = json_codec.loads(line)
+        except ValueError:
+            raise SchemaError(f'patientData.records[{index}] is not valid JSON')
+        validate_record(record, f'patientData.records[{index}]')
+        yield record
+
+
+def wants_compact_response() -> bool:
+    return request.args.get('compact', '').lower() in ('1', 'true')
+
+
+def assess_batch_entry(entry: Any, classification_cache: Dict[Tuple[str, ...], Any],
+                       compact: bool = False) -> Dict[str, Any]:
+    """
+    Score one patient of a batch request
+    Errors are reported per patient so one bad entry does not fail the batch
+    """
+    patient_id = None
+    try:
+        if isinstance(entry, (bytes, str)):
+            entry = json_codec.loads(entry)
+        if not isinstance(entry, dict):
+            return {'patientId': None, 'error': 'Invalid input format'}
+
+        patient_id = entry.get('patientId')
+        try:
+            validate_risk_request(entry)
+        except SchemaError as e:
+            return {'patientId': patient_id, 'error': f'Invalid input format: {e}'}
+
+        risk_assessments = generate_risk_assessments(
+            entry.get('patientData', {}), entry.get('familyHistory', []),
+            classification_cache)
+        if compact:
+            risk_assessments = compact_assessments(risk_assessments)
+
+        return {
+            'patientId': patient_id,
+            'riskAssessments': risk_assessments
+        }
+    except Exception as e:
+        print(f"Error processing risk assessment for patient {patient_id}: {str(e)}")
+        return {'patientId': patient_id, 'error': str(e)}
+
+
+def generate_risk_assessments(patient_data: Dict[str, Any], family_history: List[Dict[str, Any]],
+                              classification_cache: Optional[Dict[Tuple[str, ...], Any]] = None) -> List[Dict[str, Any]]:
     """
     Generate risk assessments based on patient data and family history
-    Uses actual medical record data to calculate risk factors
+    using the configured scoring engine
+    A classification cache can be shared across calls to reuse the
+    classification of relatives that appear in several family histories
     """
-    risk_assessments = []
+    if SCORING_ENGINE == 'vectorized':
+        return generate_risk_assessments_vectorized(
+            patient_data, family_history, classification_cache)
+    return generate_risk_assessments_scalar(
+        patient_data, family_history, classification_cache)
 
-    # Extract patient conditions and records
-    patient_conditions = patient_data.get('conditions', [])
-    patient_records = patient_data.get('records', [])
 
-    # Process patient records to identify additional risk factors
-    personal_risk_factors = analyze_patient_records(patient_records)
+def classify_conditions(conditions: List[str],
+                        classification_cache: Optional[Dict[Tuple[str, ...], Any]] = None) -> List[Tuple[str, Tuple[int, ...]]]:
+    """
+    Classify a list of conditions against all diseases
+    Returns (condition, relevance row) pairs
+    """
+    if classification_cache is not None:
+        key = tuple(conditions)
+        if key not in classification_cache:
+            classification_cache[key] = classify_conditions(conditions)
+        return classification_cache[key]
 
-    # Calculate risk for each disease
+    return [(condition, CONDITION_INDEX.classify(condition))
+            for condition in conditions]
+
+
+def iter_family_members(family_history: List[Dict[str, Any]]) -> Iterator[Tuple[Dict[str, Any], str, List[str]]]:
+    """
+    Yield (relative, relationship, conditions) for relatives contributing to risk
+    """
+    for relative in family_history:
+        relative_conditions = relative.get('conditions', [])
+        relationship = relative.get('relationship', 'other').lower()
+
+        # Skip if no conditions or invalid relationship
+        if not relative_conditions or not relationship:
+            continue
+
+        yield relative, relationship, relative_conditions
+
+
+def classify_family_history(family_history: List[Dict[str, Any]],
+                            classification_cache: Optional[Dict[Tuple[str, ...], Any]] = None) -> List[Tuple[Dict[str, Any], str, List[Tuple[str, Tuple[int, ...]]]]]:
+    """
+    Classify each relative's conditions against all diseases once
+    Returns (relative, relationship, [(condition, relevance row)]) entries
+    """
+    return [
+        (relative, relationship, classify_conditions(
+            relative_conditions, classification_cache))
+        for relative, relationship, relative_conditions in iter_family_members(family_history)
+    ]
+
+
+def calculate_patient_base(patient_conditions: List[str],
+                           personal_risk_factors: Dict[str, List[str]]) -> Tuple[Tuple[float, Tuple[str, ...]], ...]:
+    """
+    Calculate the patient's own base risk and risk factors for every disease
+    from their conditions and the risk factors found in their records
+    Returns (base risk, factors) per disease, in DISEASES order
+    """
+    patient_base = []
     for disease in DISEASES:
         # Base risk calculation based on patient's own conditions
         base_risk = calculate_base_risk(
@@ -78,47 +514,92 @@ def generate_risk_assessments(patient_data: Dict[str, Any], family_history: List
         factors = extract_risk_factors(disease, patient_conditions)
 
         # Add relevant risk factors from patient records
-        for factor in personal_risk_factors.get(disease, []):
-            if factor not in factors:
-                factors.append(factor)
+        append_unique(factors, set(factors), personal_risk_factors.get(disease, []))
+
+        patient_base.append((base_risk, tuple(factors)))
+
+    return tuple(patient_base)
+
+
+def calculate_relative_contributions(relationship: str, conditions: List[Tuple[str, Tuple[int, ...]]]) -> Tuple[Tuple[Tuple[str, float], ...], ...]:
+    """
+    Calculate the impact of one relative's classified conditions
+    Returns the (condition, impact) contributions per disease, in DISEASES order
+    """
+    contributions = [[] for _ in DISEASES]
+    for condition, relevance in conditions:
+        for disease_index, disease in enumerate(DISEASES):
+            # Check for conditions related to this disease
+            if relevance[disease_index] & DIRECT:
+                # Calculate more accurate impact based on relationship
+                # Using actual relationship impact factors instead of random numbers
+                impact = calculate_relationship_impact(
+                    relationship, condition, disease)
+                contributions[disease_index].append((condition, impact))
+
+    return tuple(tuple(disease_contributions) for disease_contributions in contributions)
+
+
+def generate_risk_assessments_scalar(patient_data: Dict[str, Any], family_history: List[Dict[str, Any]],
+                                     classification_cache: Optional[Dict[Tuple[str, ...], Any]] = None) -> List[Dict[str, Any]]:
+    """
+    Generate risk assessments based on patient data and family history
+    Uses actual medical record data to calculate risk factors
+    """
+    risk_assessments = []
+
+    # Extract patient conditions and records
+    patient_conditions = patient_data.get('conditions', [])
+    patient_records = patient_data.get('records', [])
+
+    # Records are scanned once, lazily when streamed. Base risk and factors
+    # depend on the records only through the factors found in them, so they
+    # are cached by the conditions and those factors; hashing the records
+    # themselves would cost more than the cache saves on long histories
+    personal_risk_factors = analyze_patient_records(patient_records)
+    patient_base = PATIENT_BASE_CACHE.get_or_compute(
+        (tuple(patient_conditions),
+         tuple((disease, tuple(factors)) for disease, factors in sorted(personal_risk_factors.items()))),
+        lambda: calculate_patient_base(patient_conditions, personal_risk_factors))
+
+    # Contributions are cached per relative, so an added or removed relative
+    # or condition only recomputes that relative's terms
+    family = []
+    for relative, relationship, relative_conditions in iter_family_members(family_history):
+        contributions = RELATIVE_CONTRIBUTION_CACHE.get_or_compute(
+            (relationship, tuple(relative_conditions)),
+            lambda: calculate_relative_contributions(relationship, classify_conditions(
+                relative_conditions, classification_cache)))
+        family.append((relative, relationship, contributions))
+
+    # Calculate risk for each disease
+    for disease_index, disease in enumerate(DISEASES):
+        base_risk, base_factors = patient_base[disease_index]
+        factors = list(base_factors)
+        seen_factors = set(factors)
 
         # Calculate family history contribution - this is the key part using real data
         family_contributions = []
         family_risk = 0
 
-        for relative in family_history:
-            relative_conditions = relative.get('conditions', [])
-            relationship = relative.get('relationship', 'other').lower()
+        for relative, relationship, contributions in family:
+            for condition, impact in contributions[disease_index]:
+                family_risk += impact
 
-            # Skip if no conditions or invalid relationship
-            if not relative_conditions or not relationship:
-                continue
-
-            # Check for conditions related to this disease
-            for condition in relative_conditions:
-                if is_condition_related_to_disease(condition, disease):
-                    # Calculate more accurate impact based on relationship
-                    # Using actual relationship impact factors instead of random numbers
-                    impact = calculate_relationship_impact(
-                        relationship, condition, disease)
-                    family_risk += impact
-
-                    family_contributions.append({
-                        'userId': relative.get('userId', ''),
-                        'condition': condition,
-                        'relationship': relationship,
-                        'impact': round(impact)
-                    })
+                family_contributions.append({
+                    'userId': relative.get('userId', ''),
+                    'condition': condition,
+                    'relationship': relationship,
+                    'impact': round(impact)
+                })
 
         # Total risk calculation - weighted based on family history significance
         total_risk = calculate_total_risk(base_risk, family_risk, disease)
 
         # Add evidence-based factors for high-risk patients
         if total_risk > 30:
-            evidence_based_factors = get_evidence_based_factors(disease)
-            for factor in evidence_based_factors:
-                if factor not in factors:
-                    factors.append(factor)
+            append_unique(factors, seen_factors,
+                          get_evidence_based_factors(disease))
 
         # Cap risk between 5% and 95%
         total_risk = max(min(total_risk, 95), 5)
@@ -141,6 +622,80 @@ def generate_risk_assessments(patient_data: Dict[str, Any], family_history: List
     return risk_assessments
 
 
+def generate_risk_assessments_vectorized(patient_data: Dict[str, Any], family_history: List[Dict[str, Any]],
+                                         classification_cache: Optional[Dict[Tuple[str, ...], Any]] = None) -> List[Dict[str, Any]]:
+    """
+    Generate risk assessments with the NumPy scoring engine
+    Produces the same output as generate_risk_assessments_scalar
+    """
+    risk_assessments = []
+
+    patient_conditions = patient_data.get('conditions', [])
+    patient_records = patient_data.get('records', [])
+    personal_risk_factors = analyze_patient_records(patient_records)
+
+    # Flatten the family into (relative, relationship, condition) pairs
+    family_pairs = []
+    family_rows = []
+    for relative, relationship, conditions in classify_family_history(family_history, classification_cache):
+        for condition, relevance in conditions:
+            family_pairs.append((relative, relationship, condition))
+            family_rows.append(relevance)
+
+    # Score all diseases in one pass
+    impacts, direct, total_risks = VECTORIZED_ENGINE.score(
+        [CONDITION_INDEX.classify(condition) for condition in patient_conditions],
+        [len(personal_risk_factors.get(disease, [])) for disease in DISEASES],
+        family_rows,
+        [relationship for _, relationship, _ in family_pairs])
+    impacts = impacts.tolist()
+    total_risks = total_risks.tolist()
+
+    for disease_index, disease in enumerate(DISEASES):
+        total_risk = total_risks[disease_index]
+
+        factors = extract_risk_factors(disease, patient_conditions)
+        seen_factors = set(factors)
+        append_unique(factors, seen_factors, personal_risk_factors.get(disease, []))
+
+        family_contributions = []
+        for pair_index in np.flatnonzero(direct[:, disease_index]):
+            relative, relationship, condition = family_pairs[pair_index]
+            family_contributions.append({
+                'userId': relative.get('userId', ''),
+                'condition': condition,
+                'relationship': relationship,
+                'impact': round(impacts[pair_index][disease_index])
+            })
+
+        if total_risk > 30:
+            append_unique(factors, seen_factors,
+                          get_evidence_based_factors(disease))
+
+        risk_assessments.append({
+            'diseaseName': disease,
+            'riskPercentage': round(total_risk),
+            'factors': factors,
+            'familyHistoryContribution': family_contributions,
+            'recommendations': generate_recommendations(disease, total_risk)
+        })
+
+    risk_assessments.sort(key=lambda x: x['riskPercentage'], reverse=True)
+
+    return risk_assessments
+
+
+def append_unique(factors: List[str], seen: Set[str], new_factors: Iterable[str]):
+    """
+    Append the factors not present yet, keeping first-seen order
+    The seen set mirrors the list so each membership check is O(1)
+    """
+    for factor in new_factors:
+        if factor not in seen:
+            seen.add(factor)
+            factors.append(factor)
+
+
 def extract_risk_factors(disease: str, patient_conditions: List[str]) -> List[str]:
     """
     Extract relevant risk factors for a disease based on patient conditions
@@ -153,6 +708,19 @@ def extract_risk_factors(disease: str, patient_conditions: List[str]) -> List[st
             factors.append(f'Existing diagnosis of {condition}')
 
     # Disease-specific factors
+    disease_factors = DISEASE_FACTOR_TABLE.get(disease)
+    if disease_factors is None:
+        disease_factors = build_disease_factors(disease)
+    factors.extend(disease_factors)
+
+    return factors
+
+
+def build_disease_factors(disease: str) -> Tuple[str, ...]:
+    """
+    Build the fixed disease-specific risk factors
+    """
+    factors = []
     disease_lower = disease.lower()
     if 'cardiovascular' in disease_lower:
         factors.extend(['Blood pressure', 'Cholesterol levels'])
@@ -167,7 +735,7 @@ def extract_risk_factors(disease: str, patient_conditions: List[str]) -> List[st
     if disease_lower in ['cancer', 'diabetes', 'cardiovascular', 'alzheimer', 'arthritis']:
         factors.append('Family history')
 
-    return factors
+    return tuple(factors)
 
 
 def is_condition_related_to_disease(condition: str, disease: str) -> bool:
@@ -175,30 +743,34 @@ def is_condition_related_to_disease(condition: str, disease: str) -> bool:
     Check if a condition is related to a disease
     Simple string matching for demonstration purposes
     """
-    condition_lower = condition.lower()
-    disease_lower = disease.lower()
-
-    # Direct match
-    if condition_lower in disease_lower or disease_lower in condition_lower:
-        return True
+    return bool(CONDITION_INDEX.relevance(condition, disease) & DIRECT)
 
-    # Related conditions
-    if 'heart' in condition_lower and 'cardiovascular' in disease_lower:
-        return True
-    if 'sugar' in condition_lower and 'diabetes' in disease_lower:
-        return True
-    if 'blood pressure' in condition_lower and ('cardiovascular' in disease_lower or 'hypertension' in disease_lower):
-        return True
-    if 'dementia' in condition_lower and 'alzheimer' in disease_lower:
-        return True
 
-    return False
+def recommendation_band(risk_percentage: float) -> str:
+    """
+    Return the recommendation band of a risk percentage
+    """
+    for band, minimum in RECOMMENDATION_BANDS:
+        if risk_percentage >= minimum:
+            return band
+    return RECOMMENDATION_BANDS[-1][0]
 
 
-def generate_recommendations(disease: str, risk_percentage: float) -> List[str]:
+def generate_recommendations(disease: str, risk_percentage: float) -> Tuple[str, ...]:
     """
     Generate recommendations based on disease type and risk level
     """
+    band = recommendation_band(risk_percentage)
+    recommendations = RECOMMENDATION_TABLE.get((disease, band))
+    if recommendations is None:
+        recommendations = build_recommendations(disease, band)
+    return recommendations
+
+
+def build_recommendations(disease: str, band: str) -> Tuple[str, ...]:
+    """
+    Build the recommendations for a disease and recommendation band
+    """
     recommendations = []
     disease_lower = disease.lower()
 
@@ -207,10 +779,10 @@ def generate_recommendations(disease: str, risk_percentage: float) -> List[str]:
         f"Discuss your {disease} risk with your healthcare provider")
 
     # Risk-level recommendations
-    if risk_percentage >= 70:
+    if band == 'high':
         recommendations.append(f"Consider genetic testing for {disease}")
         recommendations.append("Schedule regular screenings with specialists")
-    elif risk_percentage >= 40:
+    elif band == 'moderate':
         recommendations.append(
             "Consider preventive screenings earlier than standard guidelines")
         recommendations.append(
@@ -246,88 +818,48 @@ def generate_recommendations(disease: str, risk_percentage: float) -> List[str]:
             "Maintain joint mobility through appropriate exercise")
         recommendations.append("Consider anti-inflammatory diet options")
 
-    return recommendations
+    return tuple(recommendations)
 
 # Helper functions for more accurate risk assessment
 
 
-def analyze_patient_records(records: List[Dict[str, Any]]) -> Dict[str, List[str]]:
+def analyze_patient_records(records: Iterable[Dict[str, Any]]) -> Dict[str, List[str]]:
     """
     Analyze patient records to identify additional risk factors by disease
+    Records can be any iterable, including a lazily parsed stream
     """
     risk_factors = {}
 
     # Process each record for potential risk indicators
     for record in records:
-        record_type = record.get('recordType', '').lower()
-        description = record.get('description', '').lower()
-        title = record.get('title', '').lower()
-
-        # Check for cardiovascular disease risk factors
-        if any(term in description for term in ['cholesterol', 'blood pressure', 'hypertension', 'heart']):
-            if 'Cardiovascular Disease' not in risk_factors:
-                risk_factors['Cardiovascular Disease'] = []
-
-            if 'cholesterol' in description:
-                risk_factors['Cardiovascular Disease'].append(
-                    'Cholesterol issues')
-            if any(term in description for term in ['blood pressure', 'hypertension']):
-                risk_factors['Cardiovascular Disease'].append(
-                    'Blood pressure issues')
-
-        # Check for diabetes risk factors
-        if any(term in description for term in ['glucose', 'sugar', 'a1c', 'insulin']):
-            if 'Type 2 Diabetes' not in risk_factors:
-                risk_factors['Type 2 Diabetes'] = []
-            risk_factors['Type 2 Diabetes'].append('Blood sugar abnormalities')
-
-        # Check for cancer risk factors
-        if any(term in description for term in ['tumor', 'growth', 'mass', 'biopsy']):
-            for cancer_type in ['Breast Cancer', 'Colorectal Cancer']:
-                if cancer_type not in risk_factors:
-                    risk_factors[cancer_type] = []
-                risk_factors[cancer_type].append(
-                    'Previous suspicious findings')
-
-        # Check for other conditions
-        if 'cognitive' in description or 'memory' in description:
-            if 'Alzheimer\'s Disease' not in risk_factors:
-                risk_factors['Alzheimer\'s Disease'] = []
-            risk_factors['Alzheimer\'s Disease'].append('Cognitive concerns')
-
-        if 'joint' in description or 'arthritis' in description:
-            if 'Rheumatoid Arthritis' not in risk_factors:
-                risk_factors['Rheumatoid Arthritis'] = []
-            risk_factors['Rheumatoid Arthritis'].append('Joint issues')
-
-        if 'bone' in description or 'density' in description:
-            if 'Osteoporosis' not in risk_factors:
-                risk_factors['Osteoporosis'] = []
-            risk_factors['Osteoporosis'].append('Bone health concerns')
+        for indicator_index in scan_record(record):
+            _, diseases, factor = RECORD_RISK_INDICATORS[indicator_index]
+            for disease in diseases:
+                risk_factors.setdefault(disease, []).append(factor)
 
     return risk_factors
 
 
+def scan_record(record: Dict[str, Any]) -> List[int]:
+    """
+    Return the indexes of all risk indicators found in a record
+    Description and title are scanned together in a single pass
+    """
+    text = record.get('description', '').lower() + '\n' + record.get('title', '').lower()
+
+    hits = set()
+    for term in RECORD_MATCHER.find_all(text):
+        hits.update(RECORD_TERM_INDICATORS[term])
+    return sorted(hits)
+
+
 def calculate_base_risk(disease: str, conditions: List[str], risk_factors: Dict[str, List[str]]) -> float:
     """
     Calculate base risk for a disease based on patient's conditions
     """
     # Start with a baseline risk that varies by disease
-    disease_baseline = {
-        'Cardiovascular Disease': 10.0,
-        'Type 2 Diabetes': 8.0,
-        'Breast Cancer': 6.0,
-        'Colorectal Cancer': 5.0,
-        'Alzheimer\'s Disease': 7.0,
-        'Hypertension': 12.0,
-        'Asthma': 6.0,
-        'Depression': 8.0,
-        'Rheumatoid Arthritis': 5.0,
-        'Osteoporosis': 7.0
-    }
-
     # Default risk if disease not in baseline
-    base_risk = disease_baseline.get(disease, 8.0)
+    base_risk = DISEASE_BASELINE.get(disease, 8.0)
 
     # Adjust risk based on existing conditions
     for condition in conditions:
@@ -364,12 +896,8 @@ def calculate_relationship_impact(relationship: str, condition: str, disease: st
         impact *= 0.2
 
     # Adjust for genetic significance
-    if relationship in ['parent', 'sibling', 'child']:
-        # First-degree relatives have higher genetic significance
-        impact *= 1.4
-    elif relationship in ['grandparent', 'grandchild']:
-        # Second-degree relatives have moderate genetic significance
-        impact *= 1.2
+    if relationship in GENETIC_SIGNIFICANCE:
+        impact *= GENETIC_SIGNIFICANCE[relationship]
 
     return impact
 
@@ -379,20 +907,7 @@ def calculate_total_risk(base_risk: float, family_risk: float, disease: str) ->
     Calculate total risk by combining base risk and family risk with disease-specific weights
     """
     # Disease-specific family history weight
-    family_weight = {
-        'Breast Cancer': 2.0,         # Strong genetic component
-        'Colorectal Cancer': 1.8,     # Strong genetic component
-        'Alzheimer\'s Disease': 1.7,  # Significant genetic component
-        'Type 2 Diabetes': 1.5,       # Moderate genetic component
-        'Cardiovascular Disease': 1.5,  # Moderate genetic component
-        'Rheumatoid Arthritis': 1.3,  # Some genetic component
-        'Hypertension': 1.2,          # Some genetic component
-        'Osteoporosis': 1.2,          # Some genetic component
-        'Asthma': 1.1,                # Some genetic component
-        'Depression': 1.0             # Less strong genetic component
-    }
-
-    weight = family_weight.get(disease, 1.0)
+    weight = FAMILY_HISTORY_WEIGHT.get(disease, 1.0)
 
     # Calculate weighted family risk
     weighted_family_risk = family_risk * weight
@@ -404,50 +919,87 @@ def calculate_total_risk(base_risk: float, family_risk: float, disease: str) ->
     return max(min(total_risk, 95), 5)
 
 
-def get_evidence_based_factors(disease: str) -> List[str]:
+def get_evidence_based_factors(disease: str) -> Tuple[str, ...]:
     """
     Return evidence-based risk factors for specific diseases
     """
-    evidence_based_factors = {
-        'Cardiovascular Disease': ['Family history', 'Lifestyle factors', 'Diet and exercise habits'],
-        'Type 2 Diabetes': ['Family history', 'Weight management', 'Physical activity level'],
-        'Breast Cancer': ['Family history', 'Age', 'Reproductive history'],
-        'Colorectal Cancer': ['Family history', 'Diet patterns', 'Screening history'],
-        'Alzheimer\'s Disease': ['Family history', 'Cognitive activity', 'Social engagement'],
-        'Hypertension': ['Family history', 'Sodium intake', 'Stress levels'],
-        'Asthma': ['Family history', 'Environmental exposures', 'Allergies'],
-        'Depression': ['Family history', 'Stress factors', 'Previous episodes'],
-        'Rheumatoid Arthritis': ['Family history', 'Environmental factors'],
-        'Osteoporosis': ['Family history', 'Calcium intake', 'Exercise patterns']
-    }
-
-    return evidence_based_factors.get(disease, ['Family history'])
+    return EVIDENCE_BASED_FACTORS.get(disease, ('Family history',))
 
 
 def is_condition_indirectly_related(condition: str, disease: str) -> bool:
     """
     Check if a condition is indirectly related to a disease
     """
-    # Map diseases to indirectly related conditions
-    indirect_relations = {
-        'Cardiovascular Disease': ['diabetes', 'obesity', 'kidney', 'cholesterol'],
-        'Type 2 Diabetes': ['obesity', 'cardiovascular', 'hypertension'],
-        'Breast Cancer': ['hormonal', 'ovarian'],
-        'Colorectal Cancer': ['polyps', 'inflammatory bowel', 'crohn', 'colitis'],
-        'Alzheimer\'s Disease': ['cardiovascular', 'diabetes', 'depression'],
-        'Hypertension': ['kidney', 'thyroid', 'sleep apnea'],
-        'Asthma': ['allergies', 'eczema', 'respiratory'],
-        'Depression': ['anxiety', 'bipolar', 'sleep disorder'],
-        'Rheumatoid Arthritis': ['lupus', 'psoriasis', 'inflammatory'],
-        'Osteoporosis': ['hormonal', 'celiac', 'inflammatory']
-    }
-
-    condition_lower = condition.lower()
-    disease_lower = disease.lower()
+    return bool(CONDITION_INDEX.relevance(condition, disease) & INDIRECT)
+
+
+def build_string_table() -> List[str]:
+    """
+    Collect every fixed factor and recommendation string the service can emit
+    Strings containing patient data (existing diagnoses) are not included
+    """
+    strings = []
+    for disease in DISEASES:
+        strings.append('Age')
+        strings.extend(DISEASE_FACTOR_TABLE[disease])
+        strings.extend(factor for _, diseases, factor in RECORD_RISK_INDICATORS
+                       if disease in diseases)
+        strings.extend(get_evidence_based_factors(disease))
+        for band, _ in RECOMMENDATION_BANDS:
+            strings.extend(RECOMMENDATION_TABLE[(disease, band)])
+
+    return list(dict.fromkeys(strings))
+
+
+def compact_assessments(risk_assessments: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Replace dictionary strings in factors and recommendations with their IDs
+    """
+    return [{
+        **assessment,
+        'factors': [STRING_IDS.get(factor, factor) for factor in assessment['factors']],
+        'recommendations': [STRING_IDS.get(recommendation, recommendation)
+                            for recommendation in assessment['recommendations']]
+    } for assessment in risk_assessments]
+
+
+# Output tables precomputed at import, so assembling an assessment is a
+# table lookup per disease instead of rebuilding strings on every request
+DISEASE_FACTOR_TABLE = {
+    disease: build_disease_factors(disease) for disease in DISEASES
+}
+RECOMMENDATION_TABLE = {
+    (disease, band): build_recommendations(disease, band)
+    for disease in DISEASES for band, _ in RECOMMENDATION_BANDS
+}
 
-    # Check if condition is indirectly related to disease
-    related_terms = indirect_relations.get(disease, [])
-    return any(term in condition_lower for term in related_terms)
+# String dictionary for compact responses, versioned by its content
+STRING_TABLE = build_string_table()
+STRING_IDS = {string: i for i, string in enumerate(STRING_TABLE)}
+STRING_TABLE_VERSION = hashlib.sha256(
+    '\n'.join(STRING_TABLE).encode('utf-8')).hexdigest()[:16]
+
+# Version of everything a stored response depends on: the rule tables and
+# the scoring code. Editing either changes it, which invalidates the
+# responses stored under the previous version.
+RULES_SOURCES = ('risk_assessment_api.py', 'condition_index.py', 'vectorized_engine.py', 'family_graph.py')
+
+
+def rules_version() -> str:
+    digest = hashlib.sha256(content_hash([
+        DISEASES, RELATIONSHIP_IMPACT, GENETIC_SIGNIFICANCE, DISEASE_BASELINE,
+        EVIDENCE_BASED_FACTORS, RECORD_RISK_INDICATORS, RECOMMENDATION_BANDS,
+        FAMILY_HISTORY_WEIGHT, RELATED_CONDITION_RULES, INDIRECT_RELATIONS
+    ]).encode('utf-8'))
+    directory = os.path.dirname(os.path.abspath(__file__))
+    for name in RULES_SOURCES:
+        with open(os.path.join(directory, name), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+RULES_VERSION = rules_version()
+RESULT_STORE = ResultStore(RISK_STORE_PATH, RULES_VERSION, RISK_STORE_MAX_ENTRIES, RISK_STORE_TTL)
 
 
 if __name__ == '__main__':
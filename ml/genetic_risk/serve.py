@@ -0,0 +1,100 @@
+"""
+Production entry point for the genetic risk service.
+
+Runs the Flask app under gunicorn's pre-fork server with the debugger and
+reloader disabled. Every option can also be set through the environment
+variable shown in its help text.
+
+Usage: python serve.py [--workers N] [--threads N] [--port 5001] ...
+"""
+import argparse
+import multiprocessing
+import os
+
+from gunicorn.app.base import BaseApplication
+
+
+class RiskAssessmentServer(BaseApplication):
+    """
+    Embedded gunicorn application serving risk_assessment_api.app
+    """
+
+    def __init__(self, options, max_request_size):
+        self.options = options
+        self.max_request_size = max_request_size
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        from risk_assessment_api import app
+
+        app.debug = False
+        app.config['MAX_CONTENT_LENGTH'] = self.max_request_size
+        return app
+
+
+def env_int(name: str, default: int) -> int:
+    return int(os.environ.get(name, default))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--host', default=os.environ.get('RISK_API_HOST', '0.0.0.0'),
+                        help='Bind address (RISK_API_HOST)')
+    parser.add_argument('--port', type=int, default=env_int('RISK_API_PORT', 5001),
+                        help='Bind port (RISK_API_PORT)')
+    parser.add_argument('--workers', type=int,
+                        default=env_int('RISK_API_WORKERS', multiprocessing.cpu_count()),
+                        help='Worker processes, defaults to the CPU count (RISK_API_WORKERS)')
+    parser.add_argument('--threads', type=int, default=env_int('RISK_API_THREADS', 1),
+                        help='Threads per worker (RISK_API_THREADS)')
+    parser.add_argument('--keep-alive', type=int, default=env_int('RISK_API_KEEP_ALIVE', 5),
+                        help='Seconds to keep idle connections open (RISK_API_KEEP_ALIVE)')
+    parser.add_argument('--timeout', type=int, default=env_int('RISK_API_TIMEOUT', 30),
+                        help='Seconds before a silent worker is restarted (RISK_API_TIMEOUT)')
+    parser.add_argument('--graceful-timeout', type=int,
+                        default=env_int('RISK_API_GRACEFUL_TIMEOUT', 30),
+                        help='Seconds to finish in-flight requests on shutdown (RISK_API_GRACEFUL_TIMEOUT)')
+    parser.add_argument('--max-request-size', type=int,
+                        default=env_int('RISK_API_MAX_REQUEST_SIZE', 10 * 1024 * 1024),
+                        help='Maximum request body in bytes (RISK_API_MAX_REQUEST_SIZE)')
+    parser.add_argument('--max-requests', type=int, default=env_int('RISK_API_MAX_REQUESTS', 0),
+                        help='Recycle a worker after this many requests, 0 to disable (RISK_API_MAX_REQUESTS)')
+    parser.add_argument('--access-log', action='store_true',
+                        default=os.environ.get('RISK_API_ACCESS_LOG') == '1',
+                        help='Log every request to stdout (RISK_API_ACCESS_LOG=1)')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    options = {
+        'bind': f'{args.host}:{args.port}',
+        'workers': args.workers,
+        'threads': args.threads,
+        # Unlike the sync worker, gthread honours keep-alive connections
+        'worker_class': 'gthread',
+        'keepalive': args.keep_alive,
+        'timeout': args.timeout,
+        'graceful_timeout': args.graceful_timeout,
+        'max_requests': args.max_requests,
+        'max_requests_jitter': args.max_requests // 10,
+        'limit_request_line': 8190,
+        'limit_request_fields': 100,
+        'limit_request_field_size': 8190,
+        # Load the rule tables once in the master and share them with the
+        # forked workers copy-on-write
+        'preload_app': True,
+        'accesslog': '-' if args.access_log else None,
+        'errorlog': '-',
+    }
+
+    RiskAssessmentServer(options, args.max_request_size).run()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+"""
+Latency regression guard on top of benchmark.py.
+
+The timed check only runs against a saved baseline, since latencies are
+machine specific:
+
+    python benchmark.py --output baseline.json
+    RISK_BENCHMARK_BASELINE=baseline.json python -m pytest ml/genetic_risk
+
+RISK_BENCHMARK_ITERATIONS and RISK_BENCHMARK_TOLERANCE override the run
+length and the allowed relative p50 slowdown.
+"""
+import json
+import os
+
+import pytest
+
+from benchmark import SCENARIOS, TARGETS, find_regressions, run_benchmarks
+
+BASELINE_PATH = os.environ.get('RISK_BENCHMARK_BASELINE')
+ITERATIONS = int(os.environ.get('RISK_BENCHMARK_ITERATIONS', 200))
+TOLERANCE = float(os.environ.get('RISK_BENCHMARK_TOLERANCE', 0.25))
+
+
+def test_find_regressions_flags_only_slowdowns_beyond_tolerance():
+    baseline = {'small': {'scalar': {'p50Ms': 1.0}, 'http': {'p50Ms': 2.0}}}
+    results = {
+        'small': {'scalar': {'p50Ms': 1.2}, 'http': {'p50Ms': 2.6}, 'vectorized': {'p50Ms': 9.0}},
+        'medium': {'scalar': {'p50Ms': 9.0}}
+    }
+    regressions = find_regressions(results, baseline, 0.25)
+    assert len(regressions) == 1
+    assert regressions[0].startswith('small/http')
+
+
+@pytest.mark.skipif(not BASELINE_PATH, reason='RISK_BENCHMARK_BASELINE is not set')
+def test_no_p50_regression_against_baseline():
+    with open(BASELINE_PATH) as f:
+        baseline = json.load(f)
+    scenarios = {name: SCENARIOS[name] for name in baseline if name in SCENARIOS}
+    targets = sorted({target for targets in baseline.values() for target in targets if target in TARGETS})
+    results = run_benchmarks(scenarios, targets, ITERATIONS, warm=False, seed=0)
+    assert find_regressions(results, baseline, TOLERANCE) == []
@@ -0,0 +1,32 @@
+"""
+The vectorized engine must produce byte-identical JSON to the scalar one.
+
+Run with: python -m pytest ml/genetic_risk
+For larger sweeps, see compare_engines.py.
+"""
+import json
+import random
+
+import pytest
+
+from risk_assessment_api import (
+    generate_risk_assessments_scalar,
+    generate_risk_assessments_vectorized,
+)
+from workload import random_request
+
+SEED = 0
+CASES = 500
+
+
+def generate_cases():
+    rng = random.Random(SEED)
+    return [random_request(rng) for _ in range(CASES)]
+
+
+@pytest.mark.parametrize('data', generate_cases())
+def test_engines_identical(data):
+    patient_data, family_history = data['patientData'], data['familyHistory']
+    scalar = json.dumps(generate_risk_assessments_scalar(patient_data, family_history))
+    vectorized = json.dumps(generate_risk_assessments_vectorized(patient_data, family_history))
+    assert scalar == vectorized
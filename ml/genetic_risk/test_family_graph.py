@@ -0,0 +1,36 @@
+"""
+Relationships derived by FamilyGraph.
+
+Run with: python -m pytest ml/genetic_risk
+"""
+from family_graph import FamilyGraph
+
+
+def build_graph(member_ids, edges):
+    return FamilyGraph([{'id': member_id} for member_id in member_ids],
+                       [{'from': source, 'to': target, 'type': edge_type}
+                        for source, target, edge_type in edges])
+
+
+def test_sibling_edges_are_transitive_without_parents():
+    graph = build_graph('abc', [('a', 'b', 'sibling'), ('b', 'c', 'sibling')])
+    assert graph.relationship('a', 'c') == 'sibling'
+    assert graph.relationship('c', 'a') == 'sibling'
+
+
+def test_transitive_siblings_share_recorded_parents():
+    graph = build_graph('pabc', [('p', 'a', 'parent'), ('a', 'b', 'sibling'), ('b', 'c', 'sibling')])
+    assert graph.relationship('c', 'p') == 'parent'
+    assert graph.relationship('p', 'c') == 'child'
+
+
+def test_child_of_sibling_is_other():
+    graph = build_graph('abck', [('a', 'b', 'sibling'), ('b', 'c', 'sibling'), ('a', 'k', 'parent')])
+    assert graph.relationship('k', 'c') == 'other'
+    assert graph.relationship('k', 'a') == 'parent'
+
+
+def test_unconnected_members_have_no_relationship():
+    graph = build_graph('abcd', [('a', 'b', 'sibling'), ('c', 'd', 'sibling')])
+    assert graph.relationship('a', 'c') is None
+    assert [member['id'] for member, _ in graph.relatives('a')] == ['b']
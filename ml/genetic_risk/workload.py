@@ -0,0 +1,136 @@
+"""
+Synthetic workload generator for the genetic risk service.
+
+Builds risk assessment requests with a chosen family size, number of
+conditions per relative and number of medical records, drawing from a
+vocabulary that exercises every disease rule and record indicator.
+"""
+import random
+from typing import Any, Dict
+
+CONDITIONS = [
+    'Heart attack', 'High blood pressure', 'Diabetes', 'High sugar',
+    'Breast cancer', 'Cancer', 'Colon polyps', 'Crohn\'s disease', 'Dementia',
+    'Hypertension', 'Asthma', 'Eczema', 'Depression', 'Anxiety', 'Lupus',
+    'Psoriasis', 'Celiac disease', 'Kidney disease', 'Obesity', 'Thyroid disorder',
+    'Sleep apnea', 'Hormonal imbalance', 'Ovarian cyst', 'Osteoporosis',
+    'Rheumatoid arthritis', 'Migraine', 'Inflammatory bowel disease',
+    'High cholesterol', 'Allergies', 'Bipolar disorder'
+]
+
+RELATIONSHIPS = [
+    'parent', 'child', 'sibling', 'grandparent', 'grandchild', 'spouse', 'other'
+]
+
+RECORD_PHRASES = [
+    'High cholesterol noted', 'Blood pressure elevated', 'Hypertension follow-up',
+    'Heart murmur', 'Fasting glucose test', 'A1C above range', 'Insulin prescribed',
+    'Tumor found', 'Growth observed', 'Mass in left breast', 'Biopsy scheduled',
+    'Memory issues', 'Cognitive decline', 'Joint pain', 'Arthritis flare',
+    'Bone density scan', 'Routine checkup'
+]
+
+FILLER_WORDS = (
+    'patient reports mild discomfort since last visit vitals stable follow up '
+    'in two weeks advised rest hydration and continued medication review'
+).split()
+
+RECORD_TYPES = ['diagnosis', 'lab', 'prescription', 'note']
+
+
+def synthetic_request(rng: random.Random, relatives: int = 10, conditions_per_relative: int = 3,
+                      records: int = 20, record_words: int = 40) -> Dict[str, Any]:
+    """
+    Build a risk assessment request of the given size
+    """
+    family_history = [{
+        'userId': f'relative-{i}',
+        'relationship': rng.choice(RELATIONSHIPS),
+        'conditions': rng.sample(CONDITIONS, conditions_per_relative)
+    } for i in range(relatives)]
+
+    patient_records = []
+    for i in range(records):
+        words = [rng.choice(FILLER_WORDS) for _ in range(record_words)]
+        words.insert(rng.randrange(len(words) + 1), rng.choice(RECORD_PHRASES).lower())
+        patient_records.append({
+            'recordType': rng.choice(RECORD_TYPES),
+            'title': rng.choice(RECORD_PHRASES) if i % 3 == 0 else f'Visit {i}',
+            'description': ' '.join(words)
+        })
+
+    return {
+        'patientData': {
+            'conditions': rng.sample(CONDITIONS, rng.randint(0, 3)),
+            'records': patient_records
+        },
+        'familyHistory': family_history
+    }
+
+
+def random_request(rng: random.Random) -> Dict[str, Any]:
+    """
+    Build a small request of random size with edge cases mixed in:
+    unknown or missing relationships, empty condition strings and relatives
+    without conditions
+    """
+    family_history = []
+    for i in range(rng.randint(0, 15)):
+        relative = {
+            'userId': f'relative-{i}',
+            'relationship': rng.choice(RELATIONSHIPS + ['Parent', 'cousin', 'aunt', '']),
+            'conditions': rng.sample(CONDITIONS + [''], rng.randint(0, 5))
+        }
+        if rng.random() < 0.05:
+            del relative['relationship']
+        family_history.append(relative)
+
+    records = [{
+        'recordType': rng.choice(RECORD_TYPES),
+        'title': rng.choice(RECORD_PHRASES),
+        'description': ' '.join(rng.sample(RECORD_PHRASES, rng.randint(0, 3)))
+    } for _ in range(rng.randint(0, 8))]
+
+    return {
+        'patientData': {
+            'conditions': rng.sample(CONDITIONS + [''], rng.randint(0, 5)),
+            'records': records
+        },
+        'familyHistory': family_history
+    }
+
+
+def synthetic_family_graph(rng: random.Random, generations: int = 3, children_per_couple: int = 3,
+                           conditions_per_member: int = 2, records: int = 10) -> Dict[str, Any]:
+    """
+    Build a family graph request: one founding couple, and in every later
+    generation each child married to a spouse from outside the family
+    """
+    members = []
+    edges = []
+
+    def add_member() -> str:
+        member_id = f'member-{len(members)}'
+        members.append({
+            'id': member_id,
+            'conditions': rng.sample(CONDITIONS, conditions_per_member),
+            'records': synthetic_request(rng, 0, 0, records)['patientData']['records']
+        })
+        return member_id
+
+    couples = [(add_member(), add_member())]
+    edges.append({'from': couples[0][0], 'to': couples[0][1], 'type': 'spouse'})
+    for generation in range(1, generations):
+        next_couples = []
+        for first, second in couples:
+            for _ in range(children_per_couple):
+                child = add_member()
+                edges.append({'from': first, 'to': child, 'type': 'parent'})
+                edges.append({'from': second, 'to': child, 'type': 'parent'})
+                if generation < generations - 1:
+                    spouse = add_member()
+                    edges.append({'from': child, 'to': spouse, 'type': 'spouse'})
+                    next_couples.append((child, spouse))
+        couples = next_couples
+
+    return {'members': members, 'edges': edges}
@@ -0,0 +1,46 @@
+"""
+Local stand-in for the Gemini generateContent endpoint.
+
+Answers with a canned Summary/FHIR response built from the prompt, and can
+be told to fail a share of requests with 429 or 503 to exercise the client's
+retries. Point the summarizer at it with
+GEMINI_BASE_URL=http://127.0.0.1:5011/v1beta and any GEMINI_API_KEY.
+
+Usage: python llm_stub_server.py [--port 5011] [--failure-rate 0.2] [--delay 0.1]
+"""
+import argparse
+import random
+import time
+
+from flask import Flask, jsonify, request
+
+app = Flask(__name__)
+app.config['FAILURE_RATE'] = 0.0
+app.config['DELAY'] = 0.0
+
+
+@app.route('/v1beta/models/<model>:generateContent', methods=['POST'])
+def generate_content(model):
+    if not request.headers.get('X-goog-api-key'):
+        return jsonify({'error': {'code': 403, 'message': 'API key missing'}}), 403
+
+    time.sleep(app.config['DELAY'])
+    if random.random() < app.config['FAILURE_RATE']:
+        status = random.choice((429, 503))
+        return jsonify({'error': {'code': status, 'message': 'Injected failure'}}), status, {'Retry-After': '0'}
+
+    prompt = request.get_json()['contents'][0]['parts'][0]['text']
+    text = prompt.rsplit('\n\n', 1)[-1]
+    output = f"Summary\n{text[:200]}\n\nFHIR\n{{\"resourceType\": \"MedicationRequest\", \"note\": [{{\"text\": \"{model}\"}}]}}"
+    return jsonify({'candidates': [{'content': {'parts': [{'text': output}]}}]})
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--port', type=int, default=5011)
+    parser.add_argument('--failure-rate', type=float, default=0.0)
+    parser.add_argument('--delay', type=float, default=0.0)
+    args = parser.parse_args()
+    app.config['FAILURE_RATE'] = args.failure_rate
+    app.config['DELAY'] = args.delay
+    app.run(host='127.0.0.1', port=args.port, threaded=True)
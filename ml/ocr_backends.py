@@ -0,0 +1,120 @@
+"""
+Inference backends for the TrOCR line recognizer.
+
+    torch  fp32 PyTorch eager mode, as published
+    int8   PyTorch with the Linear layers dynamically quantized to int8
+    onnx   ONNX Runtime export (encoder, decoder and decoder with KV cache)
+
+The backend is chosen with OCR_BACKEND. Models are kept in a local cache
+directory (OCR_MODEL_CACHE_DIR) so nodes can start without network access
+once a model has been converted:
+
+Usage: python ocr_backends.py [--backend onnx] [--model sastry3457/TrOCR_FineTuned]
+"""
+import argparse
+import hashlib
+import os
+import time
+
+from transformers import AutoProcessor, VisionEncoderDecoderModel
+
+BACKENDS = ('torch', 'int8', 'onnx')
+
+OCR_BACKEND = os.environ.get("OCR_BACKEND", "torch")
+MODEL_CACHE_DIR = os.environ.get(
+    "OCR_MODEL_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "models")
+)
+
+
+def cache_path(model_name, backend, cache_dir=MODEL_CACHE_DIR):
+    """Returns the local directory holding a model converted for a backend."""
+    # int8 is quantized at load time from the cached fp32 weights
+    variant = 'onnx' if backend == 'onnx' else 'torch'
+    return os.path.join(cache_dir, model_name.replace('/', '--'), variant)
+
+
+def weights_fingerprint(model_name, backend, model=None, cache_dir=MODEL_CACHE_DIR):
+    """
+    Returns a hash identifying the weights load_recognition_model loads:
+    the name, size and modification time of every file of a cached
+    conversion, or otherwise the hub commit the loaded model came from.
+    """
+    digest = hashlib.sha256(f"{model_name}\n{backend}\n".encode('utf-8'))
+    local = cache_path(model_name, backend, cache_dir)
+    if os.path.isdir(local):
+        for root, dirs, files in os.walk(local):
+            dirs.sort()
+            for name in sorted(files):
+                path = os.path.join(root, name)
+                status = os.stat(path)
+                digest.update(f"{os.path.relpath(path, local)}\n{status.st_size}\n{status.st_mtime_ns}\n"
+                              .encode('utf-8'))
+    else:
+        config = getattr(model, 'config', None)
+        digest.update(str(getattr(config, '_commit_hash', None)).encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+
+def convert(model_name, backend, cache_dir=MODEL_CACHE_DIR):
+    """
+    Downloads a model and stores it in the cache in the format the backend
+    loads; for onnx this exports the encoder and the decoder with and
+    without past key values.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown OCR backend: {backend}")
+    target = cache_path(model_name, backend, cache_dir)
+
+    if backend == 'onnx':
+        from optimum.onnxruntime import ORTModelForVision2Seq
+        model = ORTModelForVision2Seq.from_pretrained(model_name, export=True, use_cache=True)
+    else:
+        model = VisionEncoderDecoderModel.from_pretrained(model_name)
+    processor = AutoProcessor.from_pretrained(model_name)
+
+    model.save_pretrained(target)
+    processor.save_pretrained(target)
+    return target
+
+
+def load_recognition_model(model_name, backend=OCR_BACKEND, cache_dir=MODEL_CACHE_DIR):
+    """
+    Returns the (model, processor) pair for a backend. Cached conversions
+    are loaded offline; a missing onnx export is created and cached first.
+    Every backend's model exposes the same generate method.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown OCR backend: {backend}")
+    local = cache_path(model_name, backend, cache_dir)
+
+    if backend == 'onnx':
+        if not os.path.isdir(local):
+            print(f"No ONNX export of {model_name} in {cache_dir}, exporting it now.")
+            convert(model_name, backend, cache_dir)
+        from optimum.onnxruntime import ORTModelForVision2Seq
+        model = ORTModelForVision2Seq.from_pretrained(local, use_cache=True)
+        return model, AutoProcessor.from_pretrained(local)
+
+    source = local if os.path.isdir(local) else model_name
+    model = VisionEncoderDecoderModel.from_pretrained(source)
+    model.eval()
+    if backend == 'int8':
+        import torch
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return model, AutoProcessor.from_pretrained(source)
+
+
+if __name__ == '__main__':
+    from ocr_pipeline import MODEL_NAME
+
+    parser = argparse.ArgumentParser(description="Convert a TrOCR model for an inference backend")
+    parser.add_argument('--backend', choices=BACKENDS, default='onnx')
+    parser.add_argument('--model', default=MODEL_NAME)
+    parser.add_argument('--cache-dir', default=MODEL_CACHE_DIR)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    path = convert(args.model, args.backend, args.cache_dir)
+    print(f"Saved {args.model} for the {args.backend} backend to {path} "
+          f"in {time.perf_counter() - started:.1f}s")
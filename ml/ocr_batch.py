@@ -0,0 +1,321 @@
+"""
+Pipelined batch OCR over a directory or manifest of prescription images.
+
+Four stages run concurrently, connected by bounded queues so a slow stage
+applies back-pressure instead of letting decoded images pile up in memory:
+
+    reader -> detection -> recognition -> post-processing -> JSONL output
+
+Readers decode image files, detection workers find and crop the text lines,
+recognition workers run TrOCR over crops from several documents at once and
+post-processing merges the text and optionally spell-checks it. Each stage
+has its own worker count. Results are written as one JSON object per line,
+in completion order; 'index' gives the position of the image in the input.
+PDFs and TIFFs are split into their pages, which go through the
+stages like separate images (rendered by the readers) and are written as
+one result per page with a 1-based 'page'.
+
+Usage:
+    python ocr_batch.py scans/ --output results.jsonl
+    python ocr_batch.py manifest.txt --detection-workers 2 --spell-check
+"""
+import argparse
+import json
+import os
+import queue
+import sys
+import threading
+import time
+
+from ocr_documents import PDF_EXTENSIONS, Document, document_kind
+from ocr_metrics import REGISTRY
+from ocr_pipeline import OCRPipeline, clean_and_merge_text, read_image
+from ocr_spelling import SPELL_CHECK
+from summarizer import SummarizationClient
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff', '.webp') + PDF_EXTENSIONS
+
+# Fields of a document written to the output; images and crops are dropped
+RESULT_KEYS = ('index', 'path', 'page', 'lines', 'text', 'correctedText', 'summary', 'fhir', 'lineStats',
+               'error', 'timings')
+
+# Marks the end of a stage's input
+DONE = object()
+
+
+def list_images(source):
+    """
+    Lists the images in a directory, or the paths in a manifest file.
+    Manifests hold one path per line, either plain or as a JSON object
+    with a 'path' key; relative paths are resolved against the manifest.
+    """
+    if os.path.isdir(source):
+        return sorted(
+            os.path.join(source, name) for name in os.listdir(source)
+            if name.lower().endswith(IMAGE_EXTENSIONS)
+        )
+
+    base = os.path.dirname(os.path.abspath(source))
+    paths = []
+    with open(source) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            path = json.loads(line)['path'] if line.startswith('{') else line
+            paths.append(os.path.join(base, path))
+    return paths
+
+
+def split_pages(index, path):
+    """
+    Returns the work items of one input file: the file itself, or one item
+    per page for a PDF or TIFF
+    """
+    if document_kind(path) is None:
+        return [{'index': index, 'path': path, 'timings': {}}]
+    try:
+        with Document(path) as document:
+            page_count = len(document)
+    except Exception as e:
+        return [{'index': index, 'path': path, 'timings': {}, 'error': f"read: {e}"}]
+    return [{'index': index, 'path': path, 'page': page + 1, 'timings': {}}
+            for page in range(page_count)]
+
+
+class Stage:
+    """
+    A pool of worker threads reading from one queue and writing to the next.
+    When every worker has seen the end marker, the stage passes one end
+    marker per downstream worker on.
+    """
+
+    def __init__(self, name, workers, handle, inbox, outbox, downstream_workers):
+        self.name = name
+        self.handle = handle
+        self.inbox = inbox
+        self.outbox = outbox
+        self.downstream_workers = downstream_workers
+        self.busy_seconds = 0.0
+        self.lock = threading.Lock()
+        self.threads = [
+            threading.Thread(target=self.run, name=f"{name}-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        self.finisher = threading.Thread(target=self.finish, name=f"{name}-finish", daemon=True)
+
+    def start(self):
+        for thread in self.threads:
+            thread.start()
+        self.finisher.start()
+
+    def run(self):
+        while True:
+            document = self.inbox.get()
+            if document is DONE:
+                return
+            self.process([document])
+
+    def process(self, documents):
+        started = time.perf_counter()
+        pending = [document for document in documents if 'error' not in document]
+        if pending:
+            try:
+                self.handle(pending)
+            except Exception as e:
+                for document in pending:
+                    document['error'] = f"{self.name}: {e}"
+        elapsed = time.perf_counter() - started
+        with self.lock:
+            self.busy_seconds += elapsed
+        for document in pending:
+            document['timings'][self.name] = round(elapsed * 1000, 1)
+        for document in documents:
+            self.outbox.put(document)
+
+    def finish(self):
+        for thread in self.threads:
+            thread.join()
+        for _ in range(self.downstream_workers):
+            self.outbox.put(DONE)
+
+
+class BatchingStage(Stage):
+    """
+    A stage that drains whatever is already queued, up to a number of line
+    crops, and hands it to the worker as one batch
+    """
+
+    def __init__(self, *args, max_lines, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.max_lines = max_lines
+
+    def run(self):
+        finished = False
+        while not finished:
+            document = self.inbox.get()
+            if document is DONE:
+                return
+            documents = [document]
+            lines = len(document.get('crops', ()))
+            while lines < self.max_lines:
+                try:
+                    document = self.inbox.get_nowait()
+                except queue.Empty:
+                    break
+                if document is DONE:
+                    finished = True
+                    break
+                documents.append(document)
+                lines += len(document.get('crops', ()))
+            self.process(documents)
+
+
+def run_batch(paths, pipeline, output, reader_workers=2, detection_workers=1,
+              recognition_workers=1, post_workers=1, queue_size=8, spell_check=False,
+              summarizer=None):
+    """
+    Runs every image through the staged pipeline and writes one JSON line
+    per image to output. Returns the number of images that failed. With a
+    summarizer, post-processing also adds the LLM summary and FHIR output;
+    raise post_workers to keep several summarization requests in flight.
+    """
+    # One PaddleOCR instance per detection worker; predict is not thread-safe
+    detectors = queue.Queue()
+    detectors.put(pipeline.ocr)
+    for _ in range(detection_workers - 1):
+        detectors.put(pipeline.create_detector())
+
+    def read(documents):
+        for document in documents:
+            if 'page' in document:
+                with Document(document['path']) as pages:
+                    document['image'] = pages.render(document['page'] - 1)
+            else:
+                document['image'] = read_image(document['path'])
+            if document['image'] is None:
+                raise ValueError(f"Could not decode image {document['path']}")
+
+    def detect(documents):
+        detector = detectors.get()
+        try:
+            for document in documents:
+                document['lineStats'] = {}
+                document['crops'] = pipeline.detect_lines(document['image'], detector,
+                                                          stats=document['lineStats'])
+                del document['image']
+        finally:
+            detectors.put(detector)
+
+    def recognize(documents):
+        # Recognize the lines of every document in the batch together
+        crops = [crop for document in documents for crop in document['crops']]
+        texts = pipeline.recognize_lines(crops)
+        position = 0
+        for document in documents:
+            count = len(document.pop('crops'))
+            document['lines'] = texts[position:position + count]
+            position += count
+
+    def post_process(documents):
+        for document in documents:
+            stats = document['lineStats']
+            removed = stats.get('detected', 0) - stats.get('kept', 0)
+            stats['lines'] = len(document['lines'])
+            stats['estimatedSavedMs'] = round(removed * (pipeline.seconds_per_line or 0.0) * 1000, 1)
+            document['text'] = clean_and_merge_text(document['lines'])
+            if spell_check:
+                document['correctedText'] = clean_and_merge_text(
+                    pipeline.spelling.correct_lines(document['lines']))
+            if summarizer is not None and document['text']:
+                result = summarizer.summarize(document.get('correctedText', document['text']))
+                document['summary'] = result['summary']
+                document['fhir'] = result['fhir']
+
+    path_queue = queue.Queue()
+    decoded = queue.Queue(maxsize=queue_size)
+    detected = queue.Queue(maxsize=queue_size)
+    recognized = queue.Queue(maxsize=queue_size)
+    finished = queue.Queue(maxsize=queue_size)
+
+    stages = [
+        Stage('read', reader_workers, read, path_queue, decoded, detection_workers),
+        Stage('detect', detection_workers, detect, decoded, detected, recognition_workers),
+        BatchingStage('recognize', recognition_workers, recognize, detected, recognized, post_workers,
+                      max_lines=pipeline.batch_size * 4),
+        Stage('post', post_workers, post_process, recognized, finished, 1),
+    ]
+
+    items = 0
+    for index, path in enumerate(paths):
+        for document in split_pages(index, path):
+            path_queue.put(document)
+            items += 1
+    for _ in range(reader_workers):
+        path_queue.put(DONE)
+
+    started = time.perf_counter()
+    for stage in stages:
+        stage.start()
+
+    failures = 0
+    while True:
+        document = finished.get()
+        if document is DONE:
+            break
+        failures += 'error' in document
+        result = {key: document[key] for key in RESULT_KEYS if key in document}
+        output.write(json.dumps(result) + '\n')
+        output.flush()
+
+    elapsed = time.perf_counter() - started
+    busy = ', '.join(f"{stage.name} {stage.busy_seconds:.1f}s" for stage in stages)
+    print(f"Processed {items} images and pages of {len(paths)} files in {elapsed:.1f}s "
+          f"({items / elapsed if elapsed else 0:.2f} images/s, {failures} failed); "
+          f"busy time: {busy}", file=sys.stderr)
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('source', help='Directory of images or manifest file')
+    parser.add_argument('--output', help='JSONL output file (default: stdout)')
+    parser.add_argument('--reader-workers', type=int, default=2)
+    parser.add_argument('--detection-workers', type=int, default=1)
+    parser.add_argument('--recognition-workers', type=int, default=1)
+    parser.add_argument('--post-workers', type=int, default=1)
+    parser.add_argument('--queue-size', type=int, default=8,
+                        help='Capacity of each queue between stages')
+    parser.add_argument('--summarize', action='store_true',
+                        help='Add an LLM summary and FHIR output to each result (see summarizer.py)')
+    parser.add_argument('--metrics', help='Write Prometheus-format stage metrics to this file')
+    parser.add_argument('--spell-check', action='store_true', default=SPELL_CHECK,
+                        help='Add spelling-corrected text to each result')
+    args = parser.parse_args()
+
+    paths = list_images(args.source)
+    pipeline = OCRPipeline()
+    summarizer = SummarizationClient() if args.summarize else None
+
+    output = open(args.output, 'w') if args.output else sys.stdout
+    try:
+        failures = run_batch(paths, pipeline, output,
+                             reader_workers=args.reader_workers,
+                             detection_workers=args.detection_workers,
+                             recognition_workers=args.recognition_workers,
+                             post_workers=args.post_workers,
+                             queue_size=args.queue_size,
+                             spell_check=args.spell_check,
+                             summarizer=summarizer)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    if args.metrics:
+        with open(args.metrics, 'w') as f:
+            f.write(REGISTRY.render_prometheus())
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,112 @@
+"""
+Clean-up of detected text boxes before recognition.
+
+Every box kept costs a TrOCR generate, so boxes are filtered by detector
+score and size, overlapping boxes are suppressed and boxes on the same
+baseline are merged into one line. Boxes are axis-aligned (x0, y0, x1, y1)
+integer tuples.
+"""
+import os
+
+MIN_BOX_SCORE = float(os.environ.get("OCR_MIN_BOX_SCORE", "0.5"))
+MIN_BOX_HEIGHT = int(os.environ.get("OCR_MIN_BOX_HEIGHT", "8"))
+MIN_BOX_AREA = int(os.environ.get("OCR_MIN_BOX_AREA", "150"))
+
+# Boxes overlapping by more than this share of the smaller box are duplicates
+NMS_OVERLAP = float(os.environ.get("OCR_NMS_OVERLAP", "0.7"))
+
+# Boxes sharing this much of their height, with a gap of at most
+# MERGE_MAX_GAP line heights, are parts of the same line
+MERGE_Y_OVERLAP = float(os.environ.get("OCR_MERGE_Y_OVERLAP", "0.6"))
+MERGE_MAX_GAP = float(os.environ.get("OCR_MERGE_MAX_GAP", "1.0"))
+
+
+def polygon_to_box(polygon):
+    """Returns the bounding box of a polygon, or None if it is degenerate."""
+    x_coords = [float(pt[0]) for pt in polygon]
+    y_coords = [float(pt[1]) for pt in polygon]
+    x_min, x_max = int(min(x_coords)), int(max(x_coords))
+    y_min, y_max = int(min(y_coords)), int(max(y_coords))
+    if x_min < x_max and y_min < y_max:
+        return x_min, y_min, x_max, y_max
+    return None
+
+
+def area(box):
+    return (box[2] - box[0]) * (box[3] - box[1])
+
+
+def filter_boxes(boxes, scores, min_score=MIN_BOX_SCORE, min_height=MIN_BOX_HEIGHT,
+                 min_area=MIN_BOX_AREA):
+    """Drops boxes below the score or size thresholds; scores may be None."""
+    kept, kept_scores = [], []
+    for index, box in enumerate(boxes):
+        score = scores[index] if scores is not None else 1.0
+        if score < min_score or box[3] - box[1] < min_height or area(box) < min_area:
+            continue
+        kept.append(box)
+        kept_scores.append(score)
+    return kept, kept_scores
+
+
+def overlap(a, b):
+    """Intersection area as a share of the smaller box."""
+    width = min(a[2], b[2]) - max(a[0], b[0])
+    height = min(a[3], b[3]) - max(a[1], b[1])
+    if width <= 0 or height <= 0:
+        return 0.0
+    return width * height / min(area(a), area(b))
+
+
+def suppress_overlaps(boxes, scores, threshold=NMS_OVERLAP):
+    """
+    Non-maximum suppression: keeps the highest scoring (then largest) box of
+    every group overlapping by more than the threshold. Overlap is measured
+    against the smaller box, so a fragment nested inside a line is dropped.
+    """
+    order = sorted(range(len(boxes)), key=lambda i: (scores[i], area(boxes[i])), reverse=True)
+    kept = []
+    for index in order:
+        if all(overlap(boxes[index], boxes[other]) <= threshold for other in kept):
+            kept.append(index)
+    return [boxes[index] for index in sorted(kept)]
+
+
+def merge_baseline(boxes, y_overlap=MERGE_Y_OVERLAP, max_gap=MERGE_MAX_GAP):
+    """
+    Merges boxes that sit on the same line and are separated by a gap of at
+    most max_gap line heights into their union
+    """
+    merged = []
+    for box in sorted(boxes, key=lambda b: b[0]):
+        for index, line in enumerate(merged):
+            height = min(box[3] - box[1], line[3] - line[1])
+            shared = min(box[3], line[3]) - max(box[1], line[1])
+            gap = box[0] - line[2]
+            if shared >= y_overlap * height and gap <= max_gap * height:
+                merged[index] = (min(line[0], box[0]), min(line[1], box[1]),
+                                 max(line[2], box[2]), max(line[3], box[3]))
+                break
+        else:
+            merged.append(box)
+    return merged
+
+
+def clean_boxes(boxes, scores):
+    """
+    Runs the full clean-up and returns the kept boxes together with counts of
+    what each step removed
+    """
+    detected = len(boxes)
+    boxes, scores = filter_boxes(boxes, scores)
+    filtered = len(boxes)
+    boxes = suppress_overlaps(boxes, scores)
+    suppressed = len(boxes)
+    boxes = merge_baseline(boxes)
+    return boxes, {
+        'detected': detected,
+        'dropped': detected - filtered,
+        'suppressed': filtered - suppressed,
+        'merged': suppressed - len(boxes),
+        'kept': len(boxes)
+    }
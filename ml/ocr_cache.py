@@ -0,0 +1,208 @@
+"""
+Caches of OCR results.
+
+LineTextCache holds recognized text for line crops. Crops are keyed by a
+hash of their exact pixels: a perceptual hash of a text line cannot tell
+"Warfarin 3mg" from "Warfarin 6mg", and a wrong dosage is worse than a
+second model call. Lines repeated pixel for pixel, such as the letterhead
+and address of re-uploaded or digitally generated prescriptions, still hit.
+
+ResultStore persists whole results on disk, keyed by the exact bytes of
+the upload, so a re-submitted prescription is answered without running
+the models, also after a restart.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+import numpy as np
+
+
+def crop_hash(crop):
+    """
+    Returns a hash of the shape and exact pixels of a line crop, as a
+    hashable key
+    """
+    digest = hashlib.blake2b(np.ascontiguousarray(crop).data, digest_size=16)
+    return crop.shape, digest.digest()
+
+
+class LineTextCache:
+    """
+    Thread-safe LRU mapping crop hashes to recognized text.
+    A maxsize of 0 disables caching.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            text = self.entries.get(key)
+            if text is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return text
+
+    def put(self, key, text):
+        if self.maxsize <= 0:
+            return
+        with self.lock:
+            self.entries[key] = text
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        with self.lock:
+            return {
+                'size': len(self.entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+
+# Kept identical to the ResultStore in the other service (ocr_cache.py and
+# genetic_risk/risk_cache.py); the services are deployed separately.
+class ResultStore:
+    """
+    Persistent store of serialized results in SQLite, keyed by content hash.
+    Keys include the store's version, which identifies the rules or models
+    that produced a result, so results of another version are never served;
+    their rows are deleted when the store is first used. Rows older than
+    ttl seconds are neither served nor kept. The database is opened lazily
+    in each process, so the store can be created before a pre-fork server
+    forks. An empty path disables the store. Database errors are logged and
+    treated as misses, so a locked or unwritable store never fails a request.
+    """
+
+    def __init__(self, path: str, version: str, max_entries: int = 100000,
+                 ttl: Optional[float] = None):
+        self.path = path
+        self.version = version
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._connection = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.invalidated = 0
+        self.errors = 0
+
+    def key(self, value: Any, data: bytes = b'') -> str:
+        """
+        Return the store key of a JSON-like value, followed by optional raw
+        bytes, under the current version
+        """
+        canonical = json.dumps([self.version, value], sort_keys=True, separators=(',', ':'), default=str)
+        digest = hashlib.sha256(canonical.encode('utf-8'))
+        digest.update(data)
+        return digest.hexdigest()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None or self._pid != os.getpid():
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS results ('
+                'key TEXT PRIMARY KEY, version TEXT NOT NULL, body BLOB NOT NULL, created REAL NOT NULL)')
+            connection.execute('CREATE INDEX IF NOT EXISTS results_created ON results (created)')
+            self.invalidated += connection.execute(
+                'DELETE FROM results WHERE version != ?', (self.version,)).rowcount
+            self._prune(connection)
+            connection.commit()
+            self._connection = connection
+            self._pid = os.getpid()
+        return self._connection
+
+    def _oldest_allowed(self) -> float:
+        return time.time() - self.ttl if self.ttl else 0.0
+
+    def _prune(self, connection: sqlite3.Connection):
+        # Drop expired rows and the oldest rows beyond max_entries
+        connection.execute('DELETE FROM results WHERE created < ?', (self._oldest_allowed(),))
+        connection.execute(
+            'DELETE FROM results WHERE key IN '
+            '(SELECT key FROM results ORDER BY created DESC LIMIT -1 OFFSET ?)',
+            (self.max_entries,))
+
+    def get(self, key: str) -> Optional[bytes]:
+        if not self.path:
+            return None
+        with self._lock:
+            try:
+                row = self._connect().execute(
+                    'SELECT body FROM results WHERE key = ? AND created >= ?',
+                    (key, self._oldest_allowed())).fetchone()
+            except (sqlite3.Error, OSError) as e:
+                print(f"Error reading the result store: {str(e)}")
+                self.errors += 1
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, body: bytes):
+        if not self.path:
+            return
+        with self._lock:
+            try:
+                connection = self._connect()
+                connection.execute(
+                    'INSERT OR REPLACE INTO results (key, version, body, created) VALUES (?, ?, ?, ?)',
+                    (key, self.version, body, time.time()))
+                self.writes += 1
+                if self.writes % 1000 == 0:
+                    self._prune(connection)
+                connection.commit()
+            except (sqlite3.Error, OSError) as e:
+                print(f"Error writing to the result store: {str(e)}")
+                self.errors += 1
+
+    def get_or_compute(self, key: str, compute: Callable[[], bytes]) -> bytes:
+        """
+        Return the stored body for key, computing and storing it on a miss
+        """
+        body = self.get(key)
+        if body is None:
+            body = compute()
+            self.put(key, body)
+        return body
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': bool(self.path),
+                'version': self.version,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hitRate': self.hits / lookups if lookups else 0.0,
+                'writes': self.writes,
+                'invalidated': self.invalidated,
+                'errors': self.errors,
+                'ttl': self.ttl
+            }
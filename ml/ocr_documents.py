@@ -0,0 +1,224 @@
+"""
+Multi-page prescription documents: scanned PDFs and TIFFs.
+
+Pages are rendered one at a time, when they are about to be recognized,
+at OCR_PDF_DPI; TIFF pages scanned at a higher resolution are scaled down
+to it. A document is never decoded as a whole, so peak memory depends on
+the number of pages in flight, not on the length of the document.
+
+recognize_document yields one result per page, in page order. With more
+than one worker, pages are recognized in parallel by worker processes that
+each load their own OCRPipeline and render the pages they are given
+themselves; at most `window` pages are in flight at any time.
+
+Usage: python ocr_documents.py scan.pdf [--workers 2] [--dpi 200] [--window 4]
+"""
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from ocr_pipeline import clean_and_merge_text
+
+# Resolution pages are rendered at; prescriptions are legible well below 300
+PDF_DPI = int(os.environ.get("OCR_PDF_DPI", "200"))
+
+# Worker processes recognizing pages of one document; 1 recognizes in process
+PAGE_WORKERS = int(os.environ.get("OCR_PAGE_WORKERS", "1"))
+
+# Pages rendered or being recognized at once; defaults to two per worker
+PAGE_WINDOW = int(os.environ.get("OCR_PAGE_WINDOW", "0"))
+
+PDF_EXTENSIONS = ('.pdf',)
+TIFF_EXTENSIONS = ('.tif', '.tiff')
+
+
+def document_kind(source):
+    """
+    Returns 'pdf' or 'tiff' for a path or encoded bytes holding a
+    multi-page format, None for anything else
+    """
+    if isinstance(source, str):
+        name = source.lower()
+        if name.endswith(PDF_EXTENSIONS):
+            return 'pdf'
+        if name.endswith(TIFF_EXTENSIONS):
+            return 'tiff'
+        return None
+    header = bytes(source[:4])
+    if header == b'%PDF':
+        return 'pdf'
+    if header in (b'II*\x00', b'MM\x00*'):
+        return 'tiff'
+    return None
+
+
+class Document:
+    """
+    A PDF or TIFF opened for rendering single pages as BGR arrays.
+    Opening only reads the page index; pages are decoded by render.
+    """
+
+    def __init__(self, source, dpi=PDF_DPI):
+        self.kind = document_kind(source)
+        self.dpi = dpi
+        if self.kind == 'pdf':
+            import pypdfium2
+            self.pdf = pypdfium2.PdfDocument(source)
+            self.page_count = len(self.pdf)
+        elif self.kind == 'tiff':
+            self.tiff = Image.open(source if isinstance(source, str) else io.BytesIO(source))
+            self.page_count = getattr(self.tiff, 'n_frames', 1)
+        else:
+            raise ValueError("Not a PDF or TIFF document")
+
+    def __len__(self):
+        return self.page_count
+
+    def render(self, index):
+        """Decodes one page (0-based) into a BGR array."""
+        if self.kind == 'pdf':
+            page = self.pdf[index]
+            try:
+                bitmap = page.render(scale=self.dpi / 72)
+                rgb = np.asarray(bitmap.to_pil().convert('RGB'))
+            finally:
+                page.close()
+        else:
+            self.tiff.seek(index)
+            frame = self.tiff.convert('RGB')
+            scanned_dpi = self.tiff.info.get('dpi', (self.dpi,))[0]
+            if scanned_dpi > self.dpi:
+                scale = self.dpi / scanned_dpi
+                frame = frame.resize((max(1, round(frame.width * scale)), max(1, round(frame.height * scale))),
+                                     Image.LANCZOS)
+            rgb = np.asarray(frame)
+        return cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR)
+
+    def close(self):
+        if self.kind == 'pdf':
+            self.pdf.close()
+        else:
+            self.tiff.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def recognize_page(pipeline, document, index):
+    """Renders and recognizes one page; the page image is dropped afterwards."""
+    try:
+        image = document.render(index)
+        lines, line_stats = pipeline.recognize_with_stats(image)
+    except Exception as e:
+        print(f"Error recognizing page {index + 1}: {e}")
+        return {'page': index + 1, 'error': str(e)}
+    return {
+        'page': index + 1,
+        'lines': lines,
+        'text': clean_and_merge_text(lines),
+        'lineStats': line_stats
+    }
+
+
+# State of a page worker process: its pipeline and the document it last opened
+_worker_pipeline = None
+_worker_document = None
+
+
+def _init_worker():
+    global _worker_pipeline
+    from ocr_pipeline import OCRPipeline
+    _worker_pipeline = OCRPipeline()
+
+
+def _recognize_page_in_worker(source, dpi, index):
+    global _worker_document
+    key = (source, dpi)
+    if _worker_document is None or _worker_document[0] != key:
+        if _worker_document is not None:
+            _worker_document[1].close()
+        _worker_document = (key, Document(source, dpi))
+    return recognize_page(_worker_pipeline, _worker_document[1], index)
+
+
+def create_page_pool(workers=PAGE_WORKERS):
+    """
+    Starts worker processes for recognize_document; reuse the pool across
+    documents, since each worker loads the models once
+    """
+    # Spawned, not forked: the parent may already hold model threads
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                               initializer=_init_worker)
+    pool.workers = workers
+    return pool
+
+
+def recognize_document(source, pipeline=None, pool=None, dpi=PDF_DPI, window=PAGE_WINDOW):
+    """
+    Yields the recognized lines and text of each page of a document, in
+    page order. Pages are recognized by the pipeline in this process, one
+    at a time, or, given a pool from create_page_pool, by its workers with
+    up to `window` pages in flight. A source given as bytes is sent to the
+    workers with every page; pass a path where there is one.
+    """
+    if pool is None:
+        if pipeline is None:
+            from ocr_pipeline import OCRPipeline
+            pipeline = OCRPipeline()
+        with Document(source, dpi) as document:
+            for index in range(len(document)):
+                yield recognize_page(pipeline, document, index)
+        return
+
+    with Document(source, dpi) as document:
+        page_count = len(document)
+    window = window or 2 * pool.workers
+    in_flight = deque()
+    next_page = 0
+    try:
+        while next_page < page_count or in_flight:
+            while next_page < page_count and len(in_flight) < window:
+                in_flight.append(pool.submit(_recognize_page_in_worker, source, dpi, next_page))
+                next_page += 1
+            yield in_flight.popleft().result()
+    finally:
+        for future in in_flight:
+            future.cancel()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('document', help='PDF or TIFF file')
+    parser.add_argument('--workers', type=int, default=PAGE_WORKERS)
+    parser.add_argument('--dpi', type=int, default=PDF_DPI)
+    parser.add_argument('--window', type=int, default=PAGE_WINDOW,
+                        help='Pages in flight at once (default: two per worker)')
+    args = parser.parse_args()
+
+    if document_kind(args.document) is None:
+        parser.error("expected a .pdf, .tif or .tiff file")
+
+    pool = create_page_pool(args.workers) if args.workers > 1 else None
+    try:
+        for page in recognize_document(args.document, pool=pool, dpi=args.dpi, window=args.window):
+            print(json.dumps(page), flush=True)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,215 @@
+"""
+Instrumentation for the OCR pipeline.
+
+Pipeline code wraps each stage (decode, detect, crop, recognize, preprocess,
+generate, cleanup, spelling, gemini) in stage(name), which records wall and CPU time
+into a process-wide registry and into the current trace. A trace covers one
+unit of work, such as an uploaded image; when it ends its per-stage timings
+and the peak RSS are logged as one JSON line (OCR_METRICS_LOG=1). The
+registry renders in the Prometheus text format for scraping.
+
+With OCR_PROFILE=1 every trace also runs under cProfile and the stats are
+written to OCR_PROFILE_DIR, one .prof file per trace, for snakeviz or pstats.
+For sampling profiles of a running service, attach py-spy to its pid instead.
+"""
+import contextvars
+import cProfile
+import json
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from functools import wraps
+
+METRICS_LOG = os.environ.get("OCR_METRICS_LOG", "0") == "1"
+PROFILE = os.environ.get("OCR_PROFILE", "0") == "1"
+PROFILE_DIR = os.environ.get("OCR_PROFILE_DIR", os.path.join(tempfile.gettempdir(), "ocr-profiles"))
+
+# Histogram bucket upper bounds, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for index, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+
+    def render(self, name, labels=''):
+        separator = ',' if labels else ''
+        lines = []
+        cumulative = 0
+        for bound, count in zip(BUCKETS, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels}{separator}le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{labels}{separator}le="+Inf"}} {self.count}')
+        suffix = f'{{{labels}}}' if labels else ''
+        lines.append(f'{name}_sum{suffix} {self.sum:.6f}')
+        lines.append(f'{name}_count{suffix} {self.count}')
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Stage timings, per-line generate time and gauges, shared by all threads
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stage_seconds = {}
+        self.stage_cpu_seconds = {}
+        self.line_seconds = Histogram()
+        self.gauges = {}
+
+    def observe_stage(self, name, wall_seconds, cpu_seconds):
+        with self.lock:
+            if name not in self.stage_seconds:
+                self.stage_seconds[name] = Histogram()
+                self.stage_cpu_seconds[name] = 0.0
+            self.stage_seconds[name].observe(wall_seconds)
+            self.stage_cpu_seconds[name] += cpu_seconds
+
+    def observe_line(self, seconds):
+        with self.lock:
+            self.line_seconds.observe(seconds)
+
+    def set_gauge(self, name, value):
+        with self.lock:
+            self.gauges[name] = value
+
+    def clear(self):
+        """Forgets the timings recorded so far; gauges are kept."""
+        with self.lock:
+            self.stage_seconds.clear()
+            self.stage_cpu_seconds.clear()
+            self.line_seconds = Histogram()
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'stages': {
+                    name: {
+                        'calls': histogram.count,
+                        'wallSeconds': round(histogram.sum, 6),
+                        'cpuSeconds': round(self.stage_cpu_seconds[name], 6)
+                    }
+                    for name, histogram in self.stage_seconds.items()
+                },
+                'generatePerLine': {
+                    'lines': self.line_seconds.count,
+                    'seconds': round(self.line_seconds.sum, 6)
+                },
+                'gauges': dict(self.gauges)
+            }
+
+    def render_prometheus(self):
+        self.set_gauge('process_peak_rss_bytes', peak_rss_bytes())
+        with self.lock:
+            lines = [
+                '# HELP ocr_stage_seconds Wall time spent in each pipeline stage.',
+                '# TYPE ocr_stage_seconds histogram',
+            ]
+            for name, histogram in sorted(self.stage_seconds.items()):
+                lines.extend(histogram.render('ocr_stage_seconds', f'stage="{name}"'))
+            lines += [
+                '# HELP ocr_stage_cpu_seconds_total CPU time of the thread running each stage.',
+                '# TYPE ocr_stage_cpu_seconds_total counter',
+            ]
+            for name, seconds in sorted(self.stage_cpu_seconds.items()):
+                lines.append(f'ocr_stage_cpu_seconds_total{{stage="{name}"}} {seconds:.6f}')
+            lines += [
+                '# HELP ocr_generate_seconds_per_line TrOCR generate time divided over the lines of a batch.',
+                '# TYPE ocr_generate_seconds_per_line histogram',
+            ]
+            lines.extend(self.line_seconds.render('ocr_generate_seconds_per_line'))
+            for name, value in sorted(self.gauges.items()):
+                metric = name if name.startswith('process_') else f'ocr_{name}'
+                lines += [f'# TYPE {metric} gauge', f'{metric} {value}']
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+_current_trace = contextvars.ContextVar('ocr_trace', default=None)
+
+# cProfile can only profile one trace at a time; concurrent traces skip it
+_profile_lock = threading.Lock()
+
+
+def peak_rss_bytes():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+@contextmanager
+def stage(name):
+    """Times a block as the named stage."""
+    wall_started = time.perf_counter()
+    cpu_started = time.thread_time()
+    try:
+        yield
+    finally:
+        wall = time.perf_counter() - wall_started
+        cpu = time.thread_time() - cpu_started
+        REGISTRY.observe_stage(name, wall, cpu)
+        record = _current_trace.get()
+        if record is not None:
+            entry = record['stages'].setdefault(name, {'calls': 0, 'wallMs': 0.0, 'cpuMs': 0.0})
+            entry['calls'] += 1
+            entry['wallMs'] += wall * 1000
+            entry['cpuMs'] += cpu * 1000
+
+
+def timed(name):
+    """Decorator timing every call of a function as the named stage."""
+    def decorate(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+@contextmanager
+def trace(event, **fields):
+    """
+    Collects the stages run inside the block into one record, which is
+    yielded so callers can add fields, and logged when the block ends
+    """
+    record = {'event': event, 'traceId': uuid.uuid4().hex[:16], 'stages': {}, **fields}
+    token = _current_trace.set(record)
+    profiler = None
+    if PROFILE and _profile_lock.acquire(blocking=False):
+        profiler = cProfile.Profile()
+        profiler.enable()
+    started = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record['totalMs'] = round((time.perf_counter() - started) * 1000, 1)
+        _current_trace.reset(token)
+        if profiler is not None:
+            profiler.disable()
+            _profile_lock.release()
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            profiler.dump_stats(os.path.join(PROFILE_DIR, f"{event}-{record['traceId']}.prof"))
+        for entry in record['stages'].values():
+            entry['wallMs'] = round(entry['wallMs'], 1)
+            entry['cpuMs'] = round(entry['cpuMs'], 1)
+        record['peakRssBytes'] = peak_rss_bytes()
+        if METRICS_LOG:
+            print(json.dumps(record), file=sys.stderr, flush=True)
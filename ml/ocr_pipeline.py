@@ -0,0 +1,451 @@
+"""
+Prescription OCR pipeline.
+
+PaddleOCR finds the text lines, the fine-tuned TrOCR model recognizes each
+line crop and the lines are merged into cleaned-up text. The models are
+loaded once by OCRPipeline and reused for every image, so a long-lived
+process only pays the startup cost once.
+"""
+import hashlib
+import json
+import os
+import re
+import time
+
+import cv2
+import numpy as np
+from paddleocr import PaddleOCR
+from PIL import Image
+
+from ocr_backends import OCR_BACKEND, load_recognition_model, weights_fingerprint
+import ocr_boxes
+from ocr_boxes import clean_boxes, polygon_to_box
+from ocr_cache import LineTextCache, crop_hash
+from ocr_metrics import REGISTRY, stage, timed
+from ocr_spelling import SPELL_CHECK, SpellingCorrector, dictionary_hash
+
+MODEL_NAME = os.environ.get("OCR_MODEL_NAME", "sastry3457/TrOCR_FineTuned")
+
+# Number of line crops passed to a single model.generate call
+RECOGNITION_BATCH_SIZE = int(os.environ.get("OCR_BATCH_SIZE", "16"))
+
+# Generation controls. 1 beam is greedy decoding; the token budget of a batch
+# grows with the aspect ratio of its widest crop, since a line holds about
+# TOKENS_PER_ASPECT tokens per line-height of width.
+NUM_BEAMS = int(os.environ.get("OCR_NUM_BEAMS", "1"))
+TOKENS_PER_ASPECT = float(os.environ.get("OCR_TOKENS_PER_ASPECT", "2.0"))
+MIN_NEW_TOKENS = int(os.environ.get("OCR_MIN_NEW_TOKENS", "8"))
+MAX_NEW_TOKENS = int(os.environ.get("OCR_MAX_NEW_TOKENS", "128"))
+
+# Number of crop hash -> text entries kept; 0 disables the cache
+LINE_CACHE_SIZE = int(os.environ.get("OCR_LINE_CACHE_SIZE", "4096"))
+
+# Filter, deduplicate and merge detected boxes before recognition (ocr_boxes)
+CLEAN_BOXES = os.environ.get("OCR_CLEAN_BOXES", "1") == "1"
+
+# Shrink crops larger than the processor's input size before handing them over
+PRESCALE_CROPS = os.environ.get("OCR_PRESCALE_CROPS", "1") == "1"
+
+# Image files at least this large are memory-mapped instead of read into memory
+MMAP_THRESHOLD_BYTES = int(os.environ.get("OCR_MMAP_THRESHOLD_BYTES", 8 * 1024 * 1024))
+
+# Modules whose code decides the recognized text; part of OCRPipeline.version
+VERSION_SOURCES = ('ocr_pipeline.py', 'ocr_boxes.py', 'ocr_spelling.py')
+
+
+def login_to_hub():
+    """Logs in to the Hugging Face hub when HF_TOKEN is set in the environment."""
+    token = os.environ.get("HF_TOKEN")
+    if token:
+        from huggingface_hub import login
+        login(token=token)
+
+
+def decode_image(data):
+    """Decodes encoded image bytes (or any buffer of them) into a BGR array."""
+    buffer = np.frombuffer(data, dtype=np.uint8)
+    if buffer.size == 0:
+        return None
+    return cv2.imdecode(buffer, cv2.IMREAD_COLOR)
+
+
+def read_image(path):
+    """
+    Reads and decodes an image file once. Large scans are memory-mapped so
+    the encoded file is never copied into a Python bytes object.
+    """
+    if os.path.getsize(path) >= MMAP_THRESHOLD_BYTES:
+        return decode_image(np.memmap(path, dtype=np.uint8, mode='r'))
+    return decode_image(np.fromfile(path, dtype=np.uint8))
+
+
+def load_image(image):
+    """Returns a decoded BGR array for a file path, encoded bytes or an array."""
+    if isinstance(image, np.ndarray) and image.ndim >= 2:
+        return image
+    if isinstance(image, str):
+        return read_image(image)
+    return decode_image(image)
+
+
+class OCRPipeline:
+    """
+    Holds the detection and recognition models and the spelling corrector.
+    Loading takes several seconds; the time spent is kept in load_seconds
+    and the time of the first (warm-up) inference in warm_up_seconds.
+    """
+
+    def __init__(self, model_name=MODEL_NAME, batch_size=RECOGNITION_BATCH_SIZE,
+                 backend=OCR_BACKEND, num_beams=NUM_BEAMS, line_cache_size=LINE_CACHE_SIZE,
+                 load_detector=True):
+        started = time.perf_counter()
+        login_to_hub()
+
+        # Without load_detector the caller assigns self.ocr before detecting
+        self.ocr = None
+        if load_detector:
+            self.ocr = self.create_detector()
+            print("PaddleOCR for text detection initialized.")
+
+        self.model_name = model_name
+        self.backend = backend
+        self.model, self.processor = load_recognition_model(model_name, backend)
+        size = getattr(self.processor, 'image_processor', self.processor).size
+        self.input_size = (size['width'], size['height'])
+        print(f"TrOCR model and processor loaded ({backend} backend).")
+
+        # Loaded on first use, or by warm_up when spell checking is on by default
+        self.spelling = SpellingCorrector()
+
+        self.batch_size = batch_size
+        self.num_beams = num_beams
+        self.version = self.results_version(weights_fingerprint(model_name, backend, self.model))
+        self.line_cache = LineTextCache(line_cache_size)
+        self.warned_unscored = False
+        # Running estimate of recognition time per line, for reporting savings
+        self.seconds_per_line = None
+        self.load_seconds = time.perf_counter() - started
+        self.warm_up_seconds = None
+        REGISTRY.set_gauge('model_load_seconds', round(self.load_seconds, 3))
+
+    def results_version(self, fingerprint):
+        """
+        Identifies what the recognized text depends on: the weights, the
+        generation, batching and box settings, the spelling dictionaries and
+        the pipeline code. Stored results of another version are stale.
+        """
+        # The token budget of a batch follows its widest crop, so the text
+        # of a line can depend on the batch size
+        digest = hashlib.sha256(json.dumps([
+            fingerprint, self.num_beams, self.batch_size, TOKENS_PER_ASPECT, MIN_NEW_TOKENS,
+            MAX_NEW_TOKENS, CLEAN_BOXES, PRESCALE_CROPS,
+            ocr_boxes.MIN_BOX_SCORE, ocr_boxes.MIN_BOX_HEIGHT, ocr_boxes.MIN_BOX_AREA,
+            ocr_boxes.NMS_OVERLAP, ocr_boxes.MERGE_Y_OVERLAP, ocr_boxes.MERGE_MAX_GAP,
+            dictionary_hash(self.spelling.dictionary_paths)
+        ]).encode('utf-8'))
+        directory = os.path.dirname(os.path.abspath(__file__))
+        for name in VERSION_SOURCES:
+            with open(os.path.join(directory, name), 'rb') as f:
+                digest.update(f.read())
+        return digest.hexdigest()[:16]
+
+    @staticmethod
+    def create_detector(cpu_threads=None):
+        """
+        Creates a PaddleOCR text detector; each concurrent detection worker
+        needs its own. cpu_threads caps Paddle's inference threads.
+        """
+        if cpu_threads is None:
+            return PaddleOCR(use_angle_cls=True, lang='en')
+        return PaddleOCR(use_angle_cls=True, lang='en', cpu_threads=cpu_threads)
+
+    def warm_up(self):
+        """
+        Runs one image through detection and recognition so lazily
+        initialized kernels and buffers are ready before the first request.
+        """
+        started = time.perf_counter()
+        image = np.full((96, 640, 3), 255, dtype=np.uint8)
+        cv2.putText(image, "Tab Paracetamol 500mg", (10, 60),
+                    cv2.FONT_HERSHEY_SIMPLEX, 1.2, (0, 0, 0), 2)
+        self.recognize(image)
+        # Detection can miss the synthetic text; make sure TrOCR ran once too
+        self.recognize_lines([image])
+        # Keep the synthetic lines out of the cache statistics
+        self.line_cache.clear()
+        if SPELL_CHECK:
+            self.spelling.load()
+        # Only real traffic should show up in the stage timings
+        REGISTRY.clear()
+        self.warm_up_seconds = time.perf_counter() - started
+        REGISTRY.set_gauge('warm_up_seconds', round(self.warm_up_seconds, 3))
+        return self.warm_up_seconds
+
+    def recognize_line(self, line_image_cv2):
+        """Recognizes text in a single cropped image line using the TrOCR model."""
+        if line_image_cv2 is None or line_image_cv2.size == 0:
+            return ""
+        try:
+            pil_image = Image.fromarray(line_image_cv2).convert("RGB")
+            pixel_values = self.processor(pil_image, return_tensors="pt").pixel_values
+            generated_ids = self.model.generate(pixel_values, **self.generation_kwargs([line_image_cv2]))
+            return self.processor.batch_decode(generated_ids, skip_special_tokens=True)[0]
+        except Exception as e:
+            print(f"Error during TrOCR recognition: {e}")
+            return ""
+
+    def generation_kwargs(self, line_images):
+        """Generation settings for a batch of crops."""
+        aspect = max(img.shape[1] / img.shape[0] for img in line_images)
+        kwargs = {
+            'num_beams': self.num_beams,
+            'max_new_tokens': min(MAX_NEW_TOKENS, MIN_NEW_TOKENS + int(aspect * TOKENS_PER_ASPECT))
+        }
+        if self.num_beams > 1:
+            kwargs['early_stopping'] = True
+        return kwargs
+
+    def fit_to_processor(self, img):
+        """
+        Shrinks each side of a crop that exceeds the processor's input size.
+        The processor resizes every crop to that size anyway; doing the
+        downscaling here with area interpolation keeps large high-DPI crops
+        from being converted and resampled at full resolution.
+        """
+        width, height = self.input_size
+        if img.shape[1] <= width and img.shape[0] <= height:
+            return img
+        target = (min(img.shape[1], width), min(img.shape[0], height))
+        return cv2.resize(img, target, interpolation=cv2.INTER_AREA)
+
+    @timed('recognize')
+    def recognize_lines(self, line_images):
+        """
+        Recognizes a list of cropped line images with batched TrOCR calls.
+        Results are returned in input order.
+        """
+        texts = [""] * len(line_images)
+        for index, text in self.iter_recognized_lines(line_images):
+            texts[index] = text
+        return texts
+
+    def iter_recognized_lines(self, line_images, ramp_up=False):
+        """
+        Yields (index, text) for each line image as soon as its text is known.
+        Crops already seen (by exact pixel hash) are answered from the line
+        cache and duplicates within the list are recognized once. The rest
+        are sorted by aspect ratio before batching so lines of similar length
+        share a batch and generate stops early instead of decoding padding
+        for a single long line; lines therefore come out of reading order.
+        With ramp_up the first batch holds a single line and each following
+        batch doubles up to the batch size, so the first text is ready after
+        one line instead of one full batch.
+        """
+        caching = self.line_cache.maxsize > 0
+
+        # Input positions waiting for the text of each distinct crop
+        pending = {}
+        for i, img in enumerate(line_images):
+            if img is None or img.size == 0:
+                yield i, ""
+                continue
+            key = crop_hash(img) if caching else i
+            if caching:
+                cached = self.line_cache.get(key)
+                if cached is not None:
+                    yield i, cached
+                    continue
+            pending.setdefault(key, []).append(i)
+
+        def aspect(key):
+            img = line_images[pending[key][0]]
+            return img.shape[1] / img.shape[0]
+
+        keys = sorted(pending, key=aspect)
+        start = 0
+        size = 1 if ramp_up else self.batch_size
+        while start < len(keys):
+            batch_keys = keys[start:start + size]
+            start += size
+            size = min(size * 2, self.batch_size)
+            batch = [line_images[pending[key][0]] for key in batch_keys]
+            started = time.perf_counter()
+            try:
+                with stage('preprocess'):
+                    prepared = [self.fit_to_processor(img) for img in batch] if PRESCALE_CROPS else batch
+                    pil_images = [Image.fromarray(img).convert("RGB") for img in prepared]
+                    pixel_values = self.processor(pil_images, return_tensors="pt").pixel_values
+                with stage('generate'):
+                    generated_ids = self.model.generate(pixel_values, **self.generation_kwargs(batch))
+                    decoded = self.processor.batch_decode(generated_ids, skip_special_tokens=True)
+                succeeded = True
+            except Exception as e:
+                # Fall back to one call per line so one bad crop only loses itself
+                print(f"Error during batched TrOCR recognition, retrying line by line: {e}")
+                decoded = [self.recognize_line(img) for img in batch]
+                succeeded = False
+            per_line = (time.perf_counter() - started) / len(batch)
+            REGISTRY.observe_line(per_line)
+            self.seconds_per_line = per_line if self.seconds_per_line is None \
+                else 0.9 * self.seconds_per_line + 0.1 * per_line
+            # The token budget follows the widest crop of the batch; only text
+            # generated under a line's own budget is cached, so a cached text
+            # does not depend on which batch the line happened to be in
+            budget = self.generation_kwargs(batch)['max_new_tokens']
+            for key, img, text in zip(batch_keys, batch, decoded):
+                if caching and succeeded and self.generation_kwargs([img])['max_new_tokens'] == budget:
+                    self.line_cache.put(key, text)
+                for i in pending[key]:
+                    yield i, text
+
+    def detect_lines(self, image, detector=None, stats=None, with_boxes=False):
+        """
+        Detects, crops, and sorts text lines from an image, correctly handling
+        different output formats from PaddleOCR.
+        The image is a file path, encoded image bytes or a decoded BGR array
+        and is decoded exactly once; the returned crops are views into it.
+        detector defaults to the pipeline's own PaddleOCR instance. Unless
+        OCR_CLEAN_BOXES is off, low-score, tiny and overlapping boxes are
+        dropped and boxes on one baseline merged; counts of each go into the
+        stats dict when one is passed. With with_boxes, (box, crop) pairs are
+        returned instead of crops, the box as (x_min, y_min, x_max, y_max).
+        """
+        detector = detector or self.ocr
+        source = image if isinstance(image, str) else "uploaded image"
+
+        with stage('decode'):
+            img = load_image(image)
+        if img is None:
+            print(f"Error: Could not read image file at {source}")
+            return []
+
+        # Use the recommended 'predict' method for consistency
+        with stage('detect'):
+            results = detector.predict(img)
+
+        if not results or not results[0]:
+            print(f"Warning: No text detected in {source}")
+            return []
+
+        ocr_data = results[0]
+
+        # Intelligently check the format of the OCR output
+        if isinstance(ocr_data, dict) and 'dt_polys' in ocr_data:
+            # Handle the detailed dictionary-like output. The PaddleOCR 3
+            # pipeline reports no detection scores, only the confidence of its
+            # own recognizer per kept polygon (rec_polys/rec_scores)
+            detected_boxes = ocr_data['dt_polys']
+            scores = ocr_data.get('dt_scores')
+            if scores is None and ocr_data.get('rec_scores') is not None and ocr_data.get('rec_polys') is not None:
+                detected_boxes = ocr_data['rec_polys']
+                scores = ocr_data['rec_scores']
+        elif isinstance(ocr_data, list):
+            # Handle the standard list-based output
+            detected_boxes = [line[0] for line in ocr_data]
+            scores = [line[1][1] for line in ocr_data]
+        else:
+            print("Warning: Unrecognized PaddleOCR output format.")
+            return []
+
+        with stage('crop'):
+            return self.crop_lines(img, detected_boxes, scores, stats, with_boxes)
+
+    def crop_lines(self, img, detected_boxes, scores, stats=None, with_boxes=False):
+        """Turns detected polygons into line crops sorted top to bottom."""
+        if scores is not None and len(scores) != len(detected_boxes):
+            scores = None
+        if scores is None:
+            # Every box then passes the MIN_BOX_SCORE filter
+            if not self.warned_unscored:
+                print("Warning: the detector returned no box scores; boxes are not filtered by score.")
+                self.warned_unscored = True
+            if stats is not None:
+                stats['unscored'] = len(detected_boxes)
+
+        boxes, box_scores = [], []
+        for index, polygon in enumerate(detected_boxes):
+            try:
+                box = polygon_to_box(polygon)
+            except (ValueError, TypeError) as e:
+                print(f"Skipping a box due to invalid coordinate point: {polygon}. Error: {e}")
+                continue
+            if box is not None:
+                boxes.append(box)
+                box_scores.append(float(scores[index]) if scores is not None else 1.0)
+
+        if CLEAN_BOXES:
+            boxes, box_stats = clean_boxes(boxes, box_scores)
+        else:
+            box_stats = {'detected': len(boxes), 'kept': len(boxes)}
+        if stats is not None:
+            stats.update(box_stats)
+
+        # Boxes may reach past the image edges; negative indices would wrap
+        height, width = img.shape[:2]
+        line_data = []
+        for x_min, y_min, x_max, y_max in boxes:
+            x_min, y_min = max(x_min, 0), max(y_min, 0)
+            x_max, y_max = min(x_max, width), min(y_max, height)
+            if x_min < x_max and y_min < y_max:
+                # Slicing gives a view; no pixels are copied here
+                box = (int(x_min), int(y_min), int(x_max), int(y_max))
+                line_data.append((box, img[y_min:y_max, x_min:x_max]))
+
+        line_data.sort(key=lambda item: item[0][1])
+        if with_boxes:
+            return line_data
+        return [crop for _, crop in line_data]
+
+    def recognize(self, image):
+        """
+        Full pipeline to get recognized lines from an image given as a file
+        path, encoded bytes or a decoded array.
+        """
+        return self.recognize_lines(self.detect_lines(image))
+
+    def recognize_with_stats(self, image):
+        """
+        Like recognize, but also returns line counts, recognition time and
+        the estimated recognition time saved by the box clean-up
+        """
+        stats = {}
+        crops = self.detect_lines(image, stats=stats)
+        started = time.perf_counter()
+        lines = self.recognize_lines(crops)
+        stats['lines'] = len(lines)
+        stats['recognitionMs'] = round((time.perf_counter() - started) * 1000, 1)
+        removed = stats.get('detected', 0) - stats.get('kept', 0)
+        stats['estimatedSavedMs'] = round(removed * (self.seconds_per_line or 0.0) * 1000, 1)
+        return lines, stats
+
+    def stream(self, image, stats=None):
+        """
+        Generator version of recognize for callers that show lines as they
+        arrive. Yields one 'detected' event with the line boxes, then a
+        'line' event per line with its reading-order index, box and text, in
+        the order lines finish recognition, and finally a 'text' event with
+        all lines in reading order and the merged text.
+        """
+        stats = {} if stats is None else stats
+        line_data = self.detect_lines(image, stats=stats, with_boxes=True)
+        boxes = [box for box, _ in line_data]
+        yield {'event': 'detected', 'lines': len(boxes), 'boxes': boxes}
+
+        texts = [""] * len(line_data)
+        started = time.perf_counter()
+        for index, text in self.iter_recognized_lines([crop for _, crop in line_data], ramp_up=True):
+            texts[index] = text
+            yield {'event': 'line', 'index': index, 'box': boxes[index], 'text': text}
+        stats['lines'] = len(texts)
+        stats['recognitionMs'] = round((time.perf_counter() - started) * 1000, 1)
+        yield {'event': 'text', 'lines': texts, 'text': clean_and_merge_text(texts)}
+
+
+@timed('cleanup')
+def clean_and_merge_text(lines):
+    """Joins and cleans a list of text lines."""
+    full_text = " ".join(lines)
+    full_text = re.sub(r'[\.\s,-]{2,}', ' ', full_text)
+    full_text = re.sub(r'\s[^a-zA-Z0-9\s]+\s', ' ', full_text)
+    full_text = re.sub(r'\s+', ' ', full_text).strip()
+    return full_text
@@ -0,0 +1,408 @@
+"""
+HTTP service for prescription OCR.
+
+Loads the OCR models once at startup, warms them up and then serves
+uploads. Cold start and per-request latency are reported at /health.
+With OCR_STORE_PATH set, results are kept in a persistent store keyed by
+the uploaded bytes, so a repeated upload skips the models.
+/api/ocr/prescription/stream sends each line as soon as it is recognized,
+as server-sent events or NDJSON, followed by the merged text and an
+optional summary.
+
+Usage: python ocr_service.py [--port 5010]
+"""
+import argparse
+import functools
+import io
+import json
+import os
+import threading
+import time
+from collections import deque
+from queue import Queue
+
+from flask import Flask, Request, Response, jsonify, request
+
+from ocr_cache import ResultStore
+from ocr_documents import PDF_DPI, Document, document_kind, recognize_page
+from ocr_metrics import REGISTRY, trace
+from ocr_pipeline import OCRPipeline, clean_and_merge_text, load_image
+from ocr_spelling import SPELL_CHECK
+from summarizer import SummarizationClient, SummarizationError
+
+
+class InMemoryRequest(Request):
+    """
+    Keeps multipart uploads in memory; werkzeug spools files larger than
+    500 KB to a temporary file by default. Upload size is bounded by
+    MAX_CONTENT_LENGTH.
+    """
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None,
+                         content_length=None):
+        return io.BytesIO()
+
+
+app = Flask(__name__)
+app.request_class = InMemoryRequest
+
+OCR_MAX_UPLOAD_BYTES = int(os.environ.get('OCR_MAX_UPLOAD_BYTES', 16 * 1024 * 1024))
+app.config['MAX_CONTENT_LENGTH'] = OCR_MAX_UPLOAD_BYTES
+
+# Number of recent requests kept for the latency percentiles at /health
+LATENCY_WINDOW = int(os.environ.get('OCR_LATENCY_WINDOW', '1000'))
+
+# Recognized uploads kept on disk. Prescriptions are patient data, so the
+# store is off unless OCR_STORE_PATH names a database file, and results
+# expire after OCR_STORE_TTL seconds.
+OCR_STORE_PATH = os.environ.get('OCR_STORE_PATH', '')
+OCR_STORE_MAX_ENTRIES = int(os.environ.get('OCR_STORE_MAX_ENTRIES', '100000'))
+OCR_STORE_TTL = float(os.environ.get('OCR_STORE_TTL', '86400'))
+
+SSE_MIMETYPE = 'text/event-stream'
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+
+class LatencyStats:
+    """
+    Request latencies over a sliding window of recent requests
+    """
+
+    def __init__(self, window):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def record(self, seconds):
+        with self.lock:
+            self.samples.append(seconds)
+            self.count += 1
+
+    def summary(self):
+        with self.lock:
+            samples = sorted(self.samples)
+            count = self.count
+        if not samples:
+            return {'requests': count}
+
+        def percentile(fraction):
+            return round(samples[min(len(samples) - 1, int(fraction * len(samples)))] * 1000, 1)
+
+        return {
+            'requests': count,
+            'p50Ms': percentile(0.50),
+            'p99Ms': percentile(0.99),
+            'meanMs': round(sum(samples) / len(samples) * 1000, 1)
+        }
+
+
+process_started = time.perf_counter()
+pipeline = OCRPipeline()
+pipeline.warm_up()
+cold_start_seconds = time.perf_counter() - process_started
+print(f"OCR service ready: models loaded in {pipeline.load_seconds:.1f}s, "
+      f"warm-up {pipeline.warm_up_seconds:.1f}s, cold start {cold_start_seconds:.1f}s")
+
+# The models are not safe to call from several threads at once
+pipeline_lock = threading.Lock()
+result_store = ResultStore(OCR_STORE_PATH, pipeline.version, OCR_STORE_MAX_ENTRIES, OCR_STORE_TTL)
+latency_stats = LatencyStats(LATENCY_WINDOW)
+# Time from upload to the first streamed line
+first_line_stats = LatencyStats(LATENCY_WINDOW)
+
+# Created on the first request asking for a summary
+summarizer = None
+summarizer_lock = threading.Lock()
+
+
+def get_summarizer():
+    global summarizer
+    with summarizer_lock:
+        if summarizer is None:
+            summarizer = SummarizationClient()
+        return summarizer
+
+
+def read_upload():
+    upload = request.files.get('image')
+    return upload.read() if upload else request.get_data()
+
+
+def open_document(data):
+    """Opens an uploaded PDF or TIFF, or returns None when it is corrupt or truncated."""
+    try:
+        return Document(data)
+    except Exception as e:
+        print(f"Error opening uploaded document: {str(e)}")
+        return None
+
+
+def wants_spell_check():
+    return request.args.get('spellCheck', '1' if SPELL_CHECK else '0') == '1'
+
+
+@app.route('/api/ocr/prescription', methods=['POST'])
+def recognize_prescription():
+    """
+    Recognize a prescription image uploaded as the multipart field 'image'
+    or as the raw request body. Spelling-corrected text is added when
+    OCR_SPELL_CHECK is on or the request asks for it with ?spellCheck=1.
+    Multi-page PDFs and TIFFs are recognized page by page; the result then
+    also has a 'pages' list and 'lines' covers all pages in order.
+    An upload recognized before by the same models is answered from the
+    result store ('stored' is then true). The ETag identifies the upload,
+    options and models, so If-None-Match gets 304 Not Modified. Results
+    with failed pages get no ETag, so they are never confirmed by a 304.
+    RFC 9110 answers a matching If-None-Match on POST with 412; the upload
+    only carries the image to read, so it is answered like a GET. The
+    wildcard "*" is ignored.
+    """
+    data = read_upload()
+    if not data:
+        return jsonify({'error': 'No image uploaded'}), 400
+
+    spell_check = wants_spell_check()
+    store_key = result_store.key({'spellCheck': spell_check, 'dpi': PDF_DPI}, data)
+    if store_key in request.if_none_match.as_set(include_weak=True):
+        response = Response(status=304)
+        response.set_etag(store_key)
+        return response
+
+    started = time.perf_counter()
+    stored = result_store.get(store_key)
+    result = json.loads(stored) if stored is not None else None
+    if result is None:
+        try:
+            with trace('prescription', uploadBytes=len(data)) as record:
+                pages = None
+                if document_kind(data) is not None:
+                    document = open_document(data)
+                    if document is None:
+                        return jsonify({'error': 'Could not open document'}), 400
+                    pages = []
+                    # One page is rendered at a time; other requests can run between pages
+                    with document:
+                        for index in range(len(document)):
+                            with pipeline_lock:
+                                pages.append(recognize_page(pipeline, document, index))
+                    lines = [line for page in pages for line in page.get('lines', [])]
+                    line_stats = {'pages': len(pages), 'lines': len(lines)}
+                    record['pages'] = len(pages)
+                else:
+                    # The upload is decoded straight from memory, outside the model lock
+                    image = load_image(data)
+                    if image is None:
+                        return jsonify({'error': 'Could not decode image'}), 400
+                    with pipeline_lock:
+                        lines, line_stats = pipeline.recognize_with_stats(image)
+                text = clean_and_merge_text(lines)
+                corrected_text = clean_and_merge_text(pipeline.spelling.correct_lines(lines)) if spell_check else None
+                record['lines'] = len(lines)
+        except Exception as e:
+            print(f"Error processing prescription image: {str(e)}")
+            return jsonify({'error': str(e)}), 500
+
+        result = {
+            'lines': lines,
+            'text': text,
+            'lineStats': line_stats,
+            'stages': record['stages']
+        }
+        if corrected_text is not None:
+            result['correctedText'] = corrected_text
+        if pages is not None:
+            result['pages'] = pages
+        # Results with failed pages are neither kept nor given an ETag; a
+        # retry may succeed and must not be answered with 304
+        complete = not any('error' in page for page in pages or [])
+        if complete:
+            result_store.put(store_key, json.dumps(result).encode('utf-8'))
+        result['stored'] = False
+    else:
+        complete = True
+        result['stored'] = True
+
+    elapsed = time.perf_counter() - started
+    latency_stats.record(elapsed)
+    result['latencyMs'] = round(elapsed * 1000, 1)
+    response = jsonify(result)
+    if complete:
+        response.set_etag(store_key)
+    return response
+
+
+@app.route('/api/ocr/prescription/stream', methods=['POST'])
+def stream_prescription():
+    """
+    Recognize an uploaded prescription and stream the results: a 'detected'
+    event with the line boxes, a 'line' event per line as soon as it is
+    recognized (index is its position in reading order), a 'text' event
+    with the merged text and, with ?summarize=1, a 'summary' event. Sent as
+    server-sent events, or as NDJSON when the client accepts
+    application/x-ndjson. Multi-page PDFs and TIFFs are streamed page by
+    page: the 'detected' and 'line' events carry a 1-based 'page', each
+    page ends with a 'page' event holding its lines and text, and the
+    'text' event covers all pages and also has a 'pages' list.
+    """
+    data = read_upload()
+    if not data:
+        return jsonify({'error': 'No image uploaded'}), 400
+
+    started = time.perf_counter()
+    image = document = None
+    if document_kind(data) is not None:
+        document = open_document(data)
+        if document is None:
+            return jsonify({'error': 'Could not open document'}), 400
+    else:
+        image = load_image(data)
+        if image is None:
+            return jsonify({'error': 'Could not decode image'}), 400
+
+    events = prescription_events(image, started, len(data), wants_spell_check(),
+                                 request.args.get('summarize', '0') == '1', document)
+    if request.accept_mimetypes.best == NDJSON_MIMETYPE:
+        body = (json.dumps(event) + '\n' for event in run_in_background(events))
+        mimetype = NDJSON_MIMETYPE
+    else:
+        body = (format_sse(event) for event in run_in_background(events))
+        mimetype = SSE_MIMETYPE
+    # Proxies must pass events on as they come instead of buffering the response
+    return Response(body, mimetype=mimetype,
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+def prescription_events(image, started, upload_bytes, spell_check, summarize, document=None):
+    """
+    Generates the events of a streamed recognition of an image or, given
+    an open document, of each of its pages; the document is closed at the end
+    """
+    if document is None:
+        pages = [(None, lambda: image)]
+    else:
+        pages = [(index + 1, functools.partial(document.render, index)) for index in range(len(document))]
+
+    try:
+        with trace('prescription_stream', uploadBytes=upload_bytes) as record:
+            line_stats = {}
+            lines = []
+            page_results = []
+            for page, render in pages:
+                try:
+                    page_image = render()
+                except Exception as e:
+                    print(f"Error rendering page {page}: {str(e)}")
+                    page_results.append({'page': page, 'error': str(e)})
+                    yield {'event': 'error', 'page': page, 'error': str(e)}
+                    continue
+
+                page_stats = {}
+                with pipeline_lock:
+                    for event in pipeline.stream(page_image, page_stats):
+                        if page is not None:
+                            event['page'] = page
+                        if event['event'] == 'line' and 'firstLineMs' not in record:
+                            elapsed = time.perf_counter() - started
+                            first_line_stats.record(elapsed)
+                            record['firstLineMs'] = round(elapsed * 1000, 1)
+                        if event['event'] == 'text':
+                            page_result = event
+                        else:
+                            yield event
+                lines.extend(page_result['lines'])
+                if page is None:
+                    line_stats = page_stats
+                else:
+                    page_results.append({'page': page, 'lines': page_result['lines'],
+                                         'text': page_result['text'], 'lineStats': page_stats})
+                    yield {'event': 'page', **page_results[-1]}
+
+            result = {'event': 'text', 'lines': lines, 'text': clean_and_merge_text(lines)}
+            if document is not None:
+                line_stats = {'pages': len(page_results), 'lines': len(lines)}
+                result['pages'] = page_results
+                record['pages'] = len(page_results)
+
+            if spell_check:
+                result['correctedText'] = clean_and_merge_text(pipeline.spelling.correct_lines(result['lines']))
+            result['lineStats'] = line_stats
+            result['latencyMs'] = round((time.perf_counter() - started) * 1000, 1)
+            record['lines'] = len(result['lines'])
+            latency_stats.record(time.perf_counter() - started)
+            yield result
+
+            if summarize:
+                try:
+                    summary = get_summarizer().summarize(result.get('correctedText', result['text']))
+                    yield {'event': 'summary', 'summary': summary['summary'], 'fhir': summary['fhir']}
+                except SummarizationError as e:
+                    yield {'event': 'error', 'error': f"Summary failed: {e}"}
+    except Exception as e:
+        print(f"Error streaming prescription image: {str(e)}")
+        yield {'event': 'error', 'error': str(e)}
+    finally:
+        if document is not None:
+            document.close()
+
+
+def run_in_background(events):
+    """
+    Runs an event generator on its own thread and yields its events, so the
+    model lock is never held while a slow client reads the response
+    """
+    queue = Queue()
+    done = object()
+
+    def produce():
+        try:
+            for event in events:
+                queue.put(event)
+        finally:
+            queue.put(done)
+
+    threading.Thread(target=produce, daemon=True).start()
+    while True:
+        event = queue.get()
+        if event is done:
+            return
+        yield event
+
+
+def format_sse(event):
+    fields = {key: value for key, value in event.items() if key != 'event'}
+    return f"event: {event['event']}\ndata: {json.dumps(fields)}\n\n"
+
+
+@app.route('/health', methods=['GET'])
+def health():
+    return jsonify({
+        'status': 'ok',
+        'model': pipeline.model_name,
+        'backend': pipeline.backend,
+        'coldStartMs': round(cold_start_seconds * 1000, 1),
+        'modelLoadMs': round(pipeline.load_seconds * 1000, 1),
+        'warmUpMs': round(pipeline.warm_up_seconds * 1000, 1),
+        'latency': latency_stats.summary(),
+        'firstLineLatency': first_line_stats.summary(),
+        'lineCache': pipeline.line_cache.stats(),
+        'spelling': pipeline.spelling.stats(),
+        'resultStore': result_store.stats()
+    })
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Stage timings, per-line generate time, model load time and peak RSS in
+    the Prometheus text format
+    """
+    return Response(REGISTRY.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=int(os.environ.get('OCR_SERVICE_PORT', '5010')))
+    args = parser.parse_args()
+    # No debug reloader: it would load the models a second time
+    app.run(host=args.host, port=args.port, threaded=True)
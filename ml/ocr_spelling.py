@@ -0,0 +1,163 @@
+"""
+Spelling correction of recognized prescription text.
+
+SymSpell is built from the English frequency dictionary with a medical
+dictionary (drug names, dosage forms, prescription abbreviations) layered
+on top, so a misread drug name is pulled towards the drug rather than a
+common English word. Building the index from the text dictionaries takes
+seconds; the built index is pickled next to the converted models and
+loaded from there afterwards. Nothing is loaded until the first correction.
+
+Usage: python ocr_spelling.py (builds the pickled index ahead of time)
+"""
+import hashlib
+import importlib.resources
+import os
+import re
+import threading
+import time
+from functools import lru_cache
+
+from symspellpy import SymSpell, Verbosity
+
+from ocr_backends import MODEL_CACHE_DIR
+from ocr_metrics import timed
+
+SPELL_CHECK = os.environ.get("OCR_SPELL_CHECK", "0") == "1"
+
+MEDICAL_DICTIONARY_PATH = os.environ.get(
+    "OCR_MEDICAL_DICTIONARY",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "medical_terms.txt")
+)
+
+# Number of distinct tokens whose correction is remembered
+TOKEN_CACHE_SIZE = int(os.environ.get("OCR_SPELLING_CACHE_SIZE", "50000"))
+
+MAX_EDIT_DISTANCE = 2
+PREFIX_LENGTH = 7
+
+# Tokens are runs of letters; anything containing digits (doses, dates) is
+# left alone by construction
+TOKEN = re.compile(r"[A-Za-z]+")
+
+
+def english_dictionary_path():
+    return str(importlib.resources.files("symspellpy") / "frequency_dictionary_en_82_765.txt")
+
+
+def dictionary_hash(dictionary_paths):
+    """Hash of the contents of the dictionaries and the index settings."""
+    digest = hashlib.sha256()
+    for path in dictionary_paths:
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    digest.update(f"{MAX_EDIT_DISTANCE}:{PREFIX_LENGTH}".encode())
+    return digest.hexdigest()[:16]
+
+
+def index_path(dictionary_paths, cache_dir=MODEL_CACHE_DIR):
+    """
+    Returns the pickle path for an index built from the given dictionaries;
+    the name includes a hash of their contents, so editing a dictionary
+    leads to a rebuild
+    """
+    return os.path.join(cache_dir, f"symspell-{dictionary_hash(dictionary_paths)}.pickle")
+
+
+def build_index(dictionary_paths):
+    sym_spell = SymSpell(max_dictionary_edit_distance=MAX_EDIT_DISTANCE, prefix_length=PREFIX_LENGTH)
+    for path in dictionary_paths:
+        sym_spell.load_dictionary(path, term_index=0, count_index=1)
+    return sym_spell
+
+
+def load_index(dictionary_paths, cache_dir=MODEL_CACHE_DIR):
+    """Loads the pickled index for the dictionaries, building and saving it if missing."""
+    path = index_path(dictionary_paths, cache_dir)
+    if os.path.exists(path):
+        sym_spell = SymSpell(max_dictionary_edit_distance=MAX_EDIT_DISTANCE, prefix_length=PREFIX_LENGTH)
+        sym_spell.load_pickle(path)
+        return sym_spell
+
+    sym_spell = build_index(dictionary_paths)
+    os.makedirs(cache_dir, exist_ok=True)
+    sym_spell.save_pickle(path)
+    return sym_spell
+
+
+def match_case(original, corrected):
+    """Applies the capitalization of the original token to its correction."""
+    if original.isupper() and len(original) > 1:
+        return corrected.upper()
+    if original[0].isupper():
+        return corrected[0].upper() + corrected[1:]
+    return corrected
+
+
+class SpellingCorrector:
+    """
+    Token-level spelling correction, initialized on first use.
+    Tokens are corrected independently, so each distinct token is looked up
+    once and its correction cached; recognized lines repeat the same drug
+    names and abbreviations over and over.
+    """
+
+    def __init__(self, dictionary_paths=None, cache_dir=MODEL_CACHE_DIR,
+                 token_cache_size=TOKEN_CACHE_SIZE):
+        if dictionary_paths is None:
+            dictionary_paths = [english_dictionary_path()]
+            if os.path.exists(MEDICAL_DICTIONARY_PATH):
+                dictionary_paths.append(MEDICAL_DICTIONARY_PATH)
+        self.dictionary_paths = dictionary_paths
+        self.cache_dir = cache_dir
+        self.sym_spell = None
+        self.load_seconds = None
+        self.lock = threading.Lock()
+        self.correct_token = lru_cache(maxsize=token_cache_size)(self._correct_token)
+
+    def load(self):
+        """Loads the index if that has not happened yet; safe to call from any thread."""
+        if self.sym_spell is None:
+            with self.lock:
+                if self.sym_spell is None:
+                    started = time.perf_counter()
+                    self.sym_spell = load_index(self.dictionary_paths, self.cache_dir)
+                    self.load_seconds = time.perf_counter() - started
+                    print(f"SymSpell index loaded in {self.load_seconds:.2f}s.")
+        return self.sym_spell
+
+    def _correct_token(self, token):
+        # Short tokens are mostly abbreviations; a one-letter edit is a guess
+        if len(token) <= 2:
+            return token
+        max_distance = 1 if len(token) <= 4 else MAX_EDIT_DISTANCE
+        suggestions = self.load().lookup(token.lower(), Verbosity.TOP, max_edit_distance=max_distance)
+        if not suggestions:
+            return token
+        return match_case(token, suggestions[0].term)
+
+    def correct_line(self, line):
+        return TOKEN.sub(lambda match: self.correct_token(match.group(0)), line)
+
+    @timed('spelling')
+    def correct_lines(self, lines):
+        return [self.correct_line(line) for line in lines]
+
+    def stats(self):
+        info = self.correct_token.cache_info()
+        return {
+            'loaded': self.sym_spell is not None,
+            'loadMs': round(self.load_seconds * 1000, 1) if self.load_seconds is not None else None,
+            'tokenCacheHits': info.hits,
+            'tokenCacheMisses': info.misses,
+            'tokenCacheSize': info.currsize
+        }
+
+
+if __name__ == '__main__':
+    corrector = SpellingCorrector()
+    path = index_path(corrector.dictionary_paths, corrector.cache_dir)
+    if os.path.exists(path):
+        os.remove(path)
+    corrector.load()
+    print(f"Saved SymSpell index to {path}")
@@ -0,0 +1,301 @@
+"""
+Pool of OCR model replicas for CPU-only nodes.
+
+PaddleOCR, PyTorch and OpenCV each size their thread pools to the whole
+machine, so one process running all three oversubscribes the cores while
+waiting on any one of them leaves cores idle. ReplicaPool instead starts K
+replica processes, pins each to its own set of cores and caps every
+library at that many threads. Images go to the replica with the fewest
+images in flight.
+
+With OCR_SHARE_WEIGHTS=fork (the default) the TrOCR weights are loaded
+once in the parent, which never runs inference, and the replicas are
+forked from it, so the weight pages are shared copy-on-write instead of
+being held K times. Each replica creates its own PaddleOCR detector after
+the fork. With OCR_SHARE_WEIGHTS=none every replica is spawned and loads
+its own copy.
+
+Usage: python ocr_workers.py scans/ [--replicas 4] [--threads 2]
+See benchmark_ocr_replicas.py for picking K and the threads per replica.
+"""
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import Future
+
+from ocr_backends import OCR_BACKEND
+from ocr_documents import document_kind, recognize_document
+from ocr_pipeline import MODEL_NAME, OCRPipeline, clean_and_merge_text, load_image
+
+OCR_REPLICAS = int(os.environ.get("OCR_REPLICAS", "2"))
+OCR_REPLICA_THREADS = int(os.environ.get("OCR_REPLICA_THREADS", "0")) or None
+SHARE_WEIGHTS = os.environ.get("OCR_SHARE_WEIGHTS", "fork")
+
+# Read by OpenMP, MKL and OpenBLAS when their thread pools are first created
+THREAD_ENV_VARS = ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS')
+
+# Replica message sent once its models are loaded and warmed up
+READY = 'ready'
+
+
+def available_cores():
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def core_sets(replicas, threads, cores=None):
+    """
+    Splits the cores into one contiguous set of `threads` cores per
+    replica; sets wrap around when replicas * threads exceeds the cores
+    """
+    cores = cores or available_cores()
+    return [[cores[(i * threads + j) % len(cores)] for j in range(threads)]
+            for i in range(replicas)]
+
+
+def limit_threads(threads, cores=None):
+    """Pins the calling process to cores and caps torch, OpenCV and OpenMP at threads."""
+    for name in THREAD_ENV_VARS:
+        os.environ[name] = str(threads)
+    if cores and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cores)
+
+    import cv2
+    import torch
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        # Only possible before the inter-op pool exists
+        pass
+    cv2.setNumThreads(threads)
+
+
+def recognize_pages(pipeline, source):
+    """
+    Recognizes every page of a PDF or TIFF; 'lines' covers all pages in
+    order and 'pages' holds the result of each page
+    """
+    pages = list(recognize_document(source, pipeline))
+    lines = [line for page in pages for line in page.get('lines', [])]
+    return {
+        'lines': lines,
+        'text': clean_and_merge_text(lines),
+        'lineStats': {'pages': len(pages), 'lines': len(lines)},
+        'pages': pages
+    }
+
+
+def _replica_main(index, pipeline, threads, cores, tasks, results, model_name, backend):
+    try:
+        limit_threads(threads, cores)
+        if pipeline is None:
+            pipeline = OCRPipeline(model_name, backend=backend, load_detector=False)
+        pipeline.ocr = pipeline.create_detector(cpu_threads=threads)
+        pipeline.warm_up()
+    except Exception as e:
+        results.put((READY, index, {'error': str(e)}))
+        return
+    results.put((READY, index, {'pid': os.getpid()}))
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            return
+        task_id, source = task
+        try:
+            if document_kind(source) is not None:
+                result = recognize_pages(pipeline, source)
+            else:
+                image = load_image(source)
+                if image is None:
+                    raise ValueError("Could not decode image")
+                lines, line_stats = pipeline.recognize_with_stats(image)
+                result = {'lines': lines, 'text': clean_and_merge_text(lines), 'lineStats': line_stats}
+        except Exception as e:
+            result = {'error': str(e)}
+        results.put((task_id, index, result))
+
+
+class ReplicaPool:
+    """
+    K OCR replica processes with least-loaded routing.
+    submit takes an image path or encoded image bytes and returns a Future
+    of {'lines', 'text', 'lineStats'} or {'error'}; PDFs and TIFFs are
+    recognized page by page and their result also has 'pages'. A replica
+    that dies fails its pending images and gets no more.
+    """
+
+    def __init__(self, replicas=OCR_REPLICAS, threads=OCR_REPLICA_THREADS, share_weights=SHARE_WEIGHTS,
+                 model_name=MODEL_NAME, backend=OCR_BACKEND, cores=None):
+        started = time.perf_counter()
+        threads = threads or max(1, len(available_cores()) // replicas)
+        self.threads = threads
+        self.core_sets = core_sets(replicas, threads, cores)
+
+        if share_weights == 'fork':
+            context = multiprocessing.get_context('fork')
+            shared = OCRPipeline(model_name, backend=backend, load_detector=False)
+        elif share_weights == 'none':
+            context = multiprocessing.get_context('spawn')
+            shared = None
+        else:
+            raise ValueError(f"Unknown OCR_SHARE_WEIGHTS mode: {share_weights}")
+
+        self.results = context.Queue()
+        self.tasks = [context.Queue() for _ in range(replicas)]
+        self.processes = [
+            context.Process(target=_replica_main, name=f"ocr-replica-{index}", daemon=True,
+                            args=(index, shared, threads, replica_cores, self.tasks[index], self.results,
+                                  model_name, backend))
+            for index, replica_cores in enumerate(self.core_sets)
+        ]
+        for process in self.processes:
+            process.start()
+        # The children hold their own references to the shared pages
+        shared = None
+
+        self.in_flight = [0] * replicas
+        self.completed = [0] * replicas
+        self.alive = [True] * replicas
+        self.futures = {}
+        self.assigned = {}
+        self.ids = itertools.count()
+        self.lock = threading.Lock()
+        self.collector = None
+
+        ready = 0
+        while ready < replicas:
+            try:
+                _, index, info = self.results.get(timeout=1.0)
+            except queue.Empty:
+                exited = [process for process in self.processes if not process.is_alive()]
+                if exited:
+                    self.close()
+                    raise RuntimeError(f"{exited[0].name} exited with code {exited[0].exitcode} while starting")
+                continue
+            if 'error' in info:
+                self.close()
+                raise RuntimeError(f"OCR replica {index} failed to start: {info['error']}")
+            ready += 1
+        self.start_seconds = time.perf_counter() - started
+
+        self.collector = threading.Thread(target=self.collect, name="ocr-replica-results", daemon=True)
+        self.collector.start()
+
+    def submit(self, source):
+        self.reap()
+        future = Future()
+        with self.lock:
+            candidates = [i for i, alive in enumerate(self.alive) if alive]
+            if not candidates:
+                raise RuntimeError("No OCR replica is running")
+            index = min(candidates, key=lambda i: (self.in_flight[i], self.completed[i]))
+            task_id = next(self.ids)
+            self.in_flight[index] += 1
+            self.futures[task_id] = future
+            self.assigned[task_id] = index
+        self.tasks[index].put((task_id, source))
+        return future
+
+    def map(self, sources):
+        """Recognizes all sources; results are in input order."""
+        futures = [self.submit(source) for source in sources]
+        return [future.result() for future in futures]
+
+    def collect(self):
+        while True:
+            try:
+                message = self.results.get(timeout=1.0)
+            except queue.Empty:
+                self.reap()
+                continue
+            if message is None:
+                return
+            task_id, index, result = message
+            with self.lock:
+                # A replica that exits right after sending a result may
+                # already have had its pending images failed by reap
+                future = self.futures.pop(task_id, None)
+                if future is None:
+                    continue
+                del self.assigned[task_id]
+                self.in_flight[index] = max(0, self.in_flight[index] - 1)
+                self.completed[index] += 1
+            future.set_result(result)
+
+    def reap(self):
+        """Fails the pending images of replicas that have exited."""
+        with self.lock:
+            for index, process in enumerate(self.processes):
+                if self.alive[index] and not process.is_alive():
+                    self.alive[index] = False
+                    lost = [task_id for task_id, replica in self.assigned.items() if replica == index]
+                    for task_id in lost:
+                        del self.assigned[task_id]
+                        self.futures.pop(task_id).set_exception(
+                            RuntimeError(f"OCR replica {index} exited with code {process.exitcode}"))
+                    self.in_flight[index] = 0
+
+    def stats(self):
+        with self.lock:
+            return [{
+                'replica': index,
+                'pid': process.pid,
+                'cores': cores,
+                'alive': self.alive[index],
+                'inFlight': self.in_flight[index],
+                'completed': self.completed[index]
+            } for index, (process, cores) in enumerate(zip(self.processes, self.core_sets))]
+
+    def close(self):
+        for tasks in self.tasks:
+            tasks.put(None)
+        for process in self.processes:
+            process.join(timeout=30)
+            if process.is_alive():
+                process.terminate()
+        if self.collector is not None:
+            self.results.put(None)
+            self.collector.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def main():
+    from ocr_batch import list_images
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('source', help='Directory of images or manifest file')
+    parser.add_argument('--replicas', type=int, default=OCR_REPLICAS)
+    parser.add_argument('--threads', type=int, default=OCR_REPLICA_THREADS,
+                        help='Threads per replica (default: the cores divided among the replicas)')
+    parser.add_argument('--share-weights', choices=('fork', 'none'), default=SHARE_WEIGHTS)
+    args = parser.parse_args()
+
+    paths = list_images(args.source)
+    with ReplicaPool(args.replicas, args.threads, args.share_weights) as pool:
+        started = time.perf_counter()
+        futures = [pool.submit(path) for path in paths]
+        for index, (path, future) in enumerate(zip(paths, futures)):
+            print(json.dumps({'index': index, 'path': path, **future.result()}), flush=True)
+        elapsed = time.perf_counter() - started
+        print(f"Recognized {len(paths)} images in {elapsed:.1f}s with {args.replicas} replicas "
+              f"x {pool.threads} threads; started in {pool.start_seconds:.1f}s", file=sys.stderr)
+        print(json.dumps(pool.stats()), file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,239 @@
+"""
+Summarization of recognized prescription text with an LLM.
+
+SummarizationClient sends the OCR text to a backend and splits the answer
+into its 'Summary' and 'FHIR' sections. It bounds the number of requests in
+flight, retries rate-limited and failed calls with exponential backoff and
+caches responses by a hash of the prompt, so identical OCR text is only
+ever sent once.
+
+Backends (LLM_BACKEND):
+    gemini  the Gemini generateContent API over a pooled HTTP session.
+            GEMINI_BASE_URL can point it at a local stub server
+            (llm_stub_server.py) for tests.
+    echo    no network; returns the prompt text as the summary
+"""
+import hashlib
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from ocr_metrics import stage
+
+LLM_BACKEND = os.environ.get("LLM_BACKEND", "gemini")
+GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY")
+GEMINI_MODEL = os.environ.get("GEMINI_MODEL", "gemini-2.0-flash")
+GEMINI_BASE_URL = os.environ.get("GEMINI_BASE_URL", "https://generativelanguage.googleapis.com/v1beta")
+
+LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", "4"))
+LLM_CONNECT_TIMEOUT = float(os.environ.get("LLM_CONNECT_TIMEOUT", "5"))
+LLM_READ_TIMEOUT = float(os.environ.get("LLM_READ_TIMEOUT", "60"))
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", "4"))
+LLM_BACKOFF_SECONDS = float(os.environ.get("LLM_BACKOFF_SECONDS", "1.0"))
+LLM_CACHE_SIZE = int(os.environ.get("LLM_CACHE_SIZE", "1024"))
+
+# Status codes worth retrying: rate limiting and transient server errors
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+PROMPT_TEMPLATE = """Analyze the provided patient data and output ONLY a concise summary and the corresponding FHIR resource(s).
+Do not include any other explanations, notes, or conversational text. No Name,Age,Date of Birth is present in the given information. DO NOT Present it.
+Format the output with clear headings for 'Summary' and 'FHIR'.
+
+{text}"""
+
+
+class SummarizationError(RuntimeError):
+    """
+    Raised when the backend cannot produce a summary
+    """
+
+
+def build_prompt(text):
+    return PROMPT_TEMPLATE.format(text=text)
+
+
+def split_sections(output_text):
+    """Splits the model output into its 'Summary' and 'FHIR' sections."""
+    summary_start = output_text.find("Summary")
+    fhir_start = output_text.find("FHIR")
+
+    summary = ""
+    fhir_resource = ""
+
+    if summary_start != -1:
+        summary_end = fhir_start if fhir_start != -1 else len(output_text)
+        summary = output_text[summary_start:summary_end].strip()
+
+    if fhir_start != -1:
+        # Extract text from "FHIR" to the end of the text
+        fhir_resource = output_text[fhir_start:].strip()
+
+    return {'summary': summary, 'fhir': fhir_resource, 'output': output_text}
+
+
+class GeminiBackend:
+    """
+    Calls generateContent over one pooled session, retrying 429/5xx answers,
+    timeouts and connection errors with exponential backoff and jitter.
+    A Retry-After header from the server takes precedence over the backoff.
+    """
+
+    def __init__(self, api_key=GEMINI_API_KEY, model=GEMINI_MODEL, base_url=GEMINI_BASE_URL,
+                 pool_size=LLM_MAX_CONCURRENCY, timeout=(LLM_CONNECT_TIMEOUT, LLM_READ_TIMEOUT),
+                 max_retries=LLM_MAX_RETRIES, backoff_seconds=LLM_BACKOFF_SECONDS):
+        if not api_key:
+            raise SummarizationError("GEMINI_API_KEY is not set")
+        self.model = model
+        self.url = f"{base_url.rstrip('/')}/models/{model}:generateContent"
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.session = requests.Session()
+        self.session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+        self.session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+        self.session.headers.update({
+            "Content-Type": "application/json",
+            "X-goog-api-key": api_key
+        })
+
+    @property
+    def name(self):
+        return f"gemini:{self.model}"
+
+    def retry_delay(self, attempt, response=None):
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return float(retry_after)
+        return self.backoff_seconds * 2 ** attempt * random.uniform(0.5, 1.5)
+
+    def generate(self, prompt):
+        payload = {"contents": [{"parts": [{"text": prompt}]}]}
+        for attempt in range(self.max_retries + 1):
+            response = None
+            try:
+                with stage('gemini'):
+                    response = self.session.post(self.url, json=payload, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt == self.max_retries:
+                    raise SummarizationError(f"Gemini request failed: {e}") from e
+            else:
+                if response.status_code == 200:
+                    return self.parse(response)
+                if response.status_code not in RETRY_STATUS or attempt == self.max_retries:
+                    raise SummarizationError(f"Gemini returned {response.status_code}: {response.text}")
+            time.sleep(self.retry_delay(attempt, response))
+
+    @staticmethod
+    def parse(response):
+        try:
+            results = response.json()
+        except ValueError as e:
+            raise SummarizationError(f"Response is not valid JSON: {e}") from e
+        try:
+            return results["candidates"][0]["content"]["parts"][0]["text"]
+        except (KeyError, IndexError) as e:
+            raise SummarizationError(f"No candidates found in the response: {e}") from e
+
+
+class EchoBackend:
+    """
+    Offline backend returning the prompt's OCR text as the summary
+    """
+
+    name = "echo"
+
+    def generate(self, prompt):
+        text = prompt.rsplit("\n\n", 1)[-1]
+        return f"Summary\n{text}"
+
+
+def create_backend(name=LLM_BACKEND):
+    if name == 'gemini':
+        return GeminiBackend()
+    if name == 'echo':
+        return EchoBackend()
+    raise ValueError(f"Unknown LLM backend: {name}")
+
+
+class SummarizationClient:
+    """
+    Thread-safe summarization front end: at most max_concurrency requests
+    reach the backend at once and results are cached by prompt hash (LRU).
+    """
+
+    def __init__(self, backend=None, max_concurrency=LLM_MAX_CONCURRENCY, cache_size=LLM_CACHE_SIZE):
+        self.backend = backend or create_backend()
+        self.max_concurrency = max_concurrency
+        self.slots = threading.BoundedSemaphore(max_concurrency)
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        # Futures of requests currently at the backend, by cache key
+        self.in_flight = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def cache_key(self, prompt):
+        return hashlib.sha256(f"{self.backend.name}\n{prompt}".encode('utf-8')).hexdigest()
+
+    def summarize(self, text):
+        """
+        Returns the summary, FHIR and raw output sections for OCR text.
+        Concurrent calls with the same text share one backend request.
+        """
+        prompt = build_prompt(text)
+        key = self.cache_key(prompt)
+        with self.lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                self.hits += 1
+                return self.cache[key]
+            pending = self.in_flight.get(key)
+            if pending is None:
+                pending = self.in_flight[key] = Future()
+                self.misses += 1
+                owner = True
+            else:
+                self.hits += 1
+                owner = False
+
+        if not owner:
+            return pending.result()
+
+        try:
+            with self.slots:
+                result = split_sections(self.backend.generate(prompt))
+        except Exception as e:
+            with self.lock:
+                del self.in_flight[key]
+            pending.set_exception(e)
+            raise
+
+        with self.lock:
+            del self.in_flight[key]
+            if self.cache_size > 0:
+                self.cache[key] = result
+                while len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+        pending.set_result(result)
+        return result
+
+    def summarize_many(self, texts):
+        """Summarizes texts concurrently; results are in input order."""
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            return list(executor.map(self.summarize, texts))
+
+    def stats(self):
+        with self.lock:
+            return {
+                'backend': self.backend.name,
+                'cacheSize': len(self.cache),
+                'cacheHits': self.hits,
+                'cacheMisses': self.misses
+            }